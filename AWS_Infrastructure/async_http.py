@@ -0,0 +1,224 @@
+import ssl
+import json
+import time
+import socket
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import certifi
+from requests.exceptions import HTTPError, ConnectTimeout, ReadTimeout
+from urllib3.util.connection import allowed_gai_family
+
+from timing import elapsed_ms
+
+
+logger = logging.getLogger()
+
+
+class EmptyResponse(ConnectionError):
+    pass
+
+
+class AsyncResponse:
+    def __init__(self, url, status_code, reason, headers, content, reused_connection, timings):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.reused_connection = reused_connection
+        self.timings = timings
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        # same message format as requests.Response.raise_for_status
+        if 400 <= self.status_code < 500:
+            raise HTTPError(f"{self.status_code} Client Error: {self.reason} for url: {self.url}", response=self)
+        if 500 <= self.status_code < 600:
+            raise HTTPError(f"{self.status_code} Server Error: {self.reason} for url: {self.url}", response=self)
+
+
+class AsyncHTTPClient:
+    # minimal HTTP/1.1 client on asyncio streams. keeps idle keep-alive connections
+    # per host and bounds the number of requests in flight with a semaphore
+    def __init__(self, max_concurrency):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle = {}
+        self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+    async def request(self, method, url, headers=None, json_body=None, timeout=None):
+        # timeout is a (connect, read) pair of seconds like in requests, read covering the whole exchange
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        target = parts.path or '/'
+        if parts.query:
+            target = f"{target}?{parts.query}"
+
+        body = json.dumps(json_body).encode('utf-8') if json_body is not None else b''
+        request_headers = {
+            'Host': parts.netloc,
+            'Accept': '*/*',
+            'Connection': 'keep-alive',
+            'Content-Length': str(len(body))
+        }
+        if json_body is not None:
+            request_headers['Content-Type'] = 'application/json'
+        request_headers.update(headers or {})
+
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in request_headers.items() if value is not None)
+        data = head.encode('latin-1') + b'\r\n' + body
+
+        connect_timeout, read_timeout = timeout or (None, None)
+        key = (parts.scheme, host, port)
+        async with self._semaphore:
+            start = time.perf_counter()
+            idle = self._idle_connection(key)
+            if idle is not None:
+                reader, writer = idle
+                try:
+                    timings = {'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+                    return await self._timed_exchange(key, url, reader, writer, data, True, timings, start, read_timeout)
+                except (ConnectionError, asyncio.IncompleteReadError, EmptyResponse):
+                    writer.close()
+                    # the request may have reached the server before the connection dropped, only a GET
+                    # is sent again here, the other methods are left to retries.classify
+                    if method != 'GET':
+                        raise
+                    logger.info(f"Reused connection to {host} was closed, sending the GET again on a new one")
+
+            try:
+                reader, writer, timings = await asyncio.wait_for(self._connect(host, port, secure), connect_timeout)
+            except asyncio.TimeoutError as e:
+                raise ConnectTimeout(f"Connection to {host} timed out. (connect timeout={connect_timeout})") from e
+            return await self._timed_exchange(key, url, reader, writer, data, False, timings, start, read_timeout)
+
+    def _idle_connection(self, key):
+        # the most recently used idle connection still open, the ones the server closed while
+        # they were idle are dropped before anything is written to them
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not (reader.at_eof() or writer.is_closing()):
+                return reader, writer
+            writer.close()
+        return None
+
+    async def _timed_exchange(self, key, url, reader, writer, data, reused, timings, start, read_timeout):
+        try:
+            return await asyncio.wait_for(self._exchange(key, url, reader, writer, data, reused, timings, start), read_timeout)
+        except asyncio.TimeoutError as e:
+            raise ReadTimeout(f"Read timed out for url: {url}. (read timeout={read_timeout})") from e
+
+    async def _connect(self, host, port, secure):
+        # resolve, connect and handshake separately to time each phase
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        # same address families as urllib3: IPv6 records only when the system supports IPv6
+        addresses = await loop.getaddrinfo(host, port, family=allowed_gai_family(), type=socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+
+        # the resolved addresses are tried in order, the error of the last one is raised when none connects
+        error = OSError(f"getaddrinfo returned no address for {host}")
+        for family, sock_type, proto, _, address in addresses:
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, address)
+                break
+            except OSError as e:
+                sock.close()
+                error = e
+            except BaseException:
+                sock.close()
+                raise
+        else:
+            raise error
+        connected = time.perf_counter()
+
+        reader, writer = await asyncio.open_connection(
+            sock=sock,
+            ssl=self._ssl_context if secure else None,
+            server_hostname=host if secure else None
+        )
+        timings = {
+            'dns': elapsed_ms(start, resolved),
+            'connect': elapsed_ms(resolved, connected),
+            'tls': elapsed_ms(connected) if secure else 0.0
+        }
+        return reader, writer, timings
+
+    async def _exchange(self, key, url, reader, writer, data, reused, timings, start):
+        try:
+            request_start = time.perf_counter()
+            writer.write(data)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise EmptyResponse(url)
+            timings['ttfb'] = elapsed_ms(request_start)
+            version, status_code, reason = _parse_status_line(status_line)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            body_start = time.perf_counter()
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            if 'chunked' in headers.get('transfer-encoding', '').lower():
+                content = await _read_chunked(reader)
+            elif 'content-length' in headers:
+                content = await reader.readexactly(int(headers['content-length']))
+            else:
+                content = await reader.read()
+                keep_alive = False
+
+            timings['body'] = elapsed_ms(body_start)
+            timings['wall'] = elapsed_ms(start)
+
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+        return AsyncResponse(url, status_code, reason, headers, content, reused, timings)
+
+    async def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+def _parse_status_line(line):
+    version, status_code, *reason = line.decode('latin-1').strip().split(' ', 2)
+    return version, int(status_code), reason[0] if reason else ''
+
+
+async def _read_chunked(reader):
+    content = bytearray()
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            # skip trailers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return bytes(content)
+        content += await reader.readexactly(size)
+        await reader.readline()
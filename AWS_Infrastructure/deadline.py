@@ -0,0 +1,58 @@
+import os
+import time
+import logging
+
+
+logger = logging.getLogger()
+
+
+# Time kept before the Lambda timeout to checkpoint the run and answer
+DEADLINE_SAFETY_MARGIN_MS = int(os.environ.get("DEADLINE_SAFETY_MARGIN_MS", "3000"))
+# Longest a single step call may take and the share of it given to opening the connection
+STEP_MAX_TIMEOUT = float(os.environ.get("STEP_MAX_TIMEOUT", "60"))
+STEP_CONNECT_TIMEOUT = float(os.environ.get("STEP_CONNECT_TIMEOUT", "3.05"))
+# A step is not started with less time than this left
+STEP_MIN_BUDGET = float(os.environ.get("STEP_MIN_BUDGET", "0.5"))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    # point in time the run has to stop at, STEP_MAX_TIMEOUT per call when there is no context
+    def __init__(self, remaining_ms=None):
+        self.expires_at = None
+        if remaining_ms is not None:
+            self.expires_at = time.monotonic() + (remaining_ms - DEADLINE_SAFETY_MARGIN_MS) / 1000
+
+    @classmethod
+    def from_context(cls, context):
+        get_remaining_time = getattr(context, 'get_remaining_time_in_millis', None)
+        return cls(get_remaining_time() if get_remaining_time else None)
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining < STEP_MIN_BUDGET
+
+    def check(self, step_name):
+        if self.expired():
+            raise DeadlineExceeded(f"Not enough time left to execute step {step_name}")
+
+    def step_timeout(self):
+        # (connect, read) timeouts of the next call, never running past the deadline
+        budget = STEP_MAX_TIMEOUT
+        remaining = self.remaining()
+        if remaining is not None:
+            budget = max(min(budget, remaining), STEP_MIN_BUDGET)
+        connect = min(STEP_CONNECT_TIMEOUT, budget / 2)
+        return round(connect, 3), round(budget - connect, 3)
+
+    def __repr__(self):
+        remaining = self.remaining()
+        return f"Deadline(remaining={'none' if remaining is None else f'{remaining:.2f}s'})"
@@ -0,0 +1,71 @@
+import json
+import string
+import logging
+import importlib
+import threading
+
+
+logger = logging.getLogger()
+
+
+# handlers imported so far and the resources shared between them
+_handlers = {}
+_boto3_clients = {}
+_lock = threading.RLock()
+
+
+class StepHandlerError(Exception):
+    def __init__(self, handler_path, status_code, body):
+        super().__init__(f"{status_code} Error from {handler_path}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+def _bind_shared_resources(module):
+    # one boto3 client per service for all the handlers of this container. the MongoDB client is
+    # already shared, the handlers get it from the mongo_common module they all import
+    try:
+        from botocore.client import BaseClient
+    except ImportError:
+        return
+
+    for name, value in list(vars(module).items()):
+        if isinstance(value, BaseClient):
+            service_name = value.meta.service_model.service_name
+            with _lock:
+                shared_client = _boto3_clients.setdefault(service_name, value)
+            setattr(module, name, shared_client)
+
+
+def get_handler(handler_path):
+    with _lock:
+        handler = _handlers.get(handler_path)
+        if handler is None:
+            module_name, _, function_name = handler_path.rpartition('.')
+            logger.info(f"Importing step handler: {handler_path}")
+            module = importlib.import_module(module_name)
+            _bind_shared_resources(module)
+            handler = getattr(module, function_name)
+            _handlers[handler_path] = handler
+    return handler
+
+
+def build_event(url_template, method, path_params, payload, headers):
+    # synthesize the API Gateway event the handler would receive for this step
+    fields = {field for _, field, _, _ in string.Formatter().parse(url_template) if field}
+    return {
+        'httpMethod': method,
+        'pathParameters': {name: value for name, value in path_params.items() if name in fields},
+        'headers': {name.lower(): value for name, value in headers.items()},
+        'body': json.dumps(payload) if method == 'POST' else None,
+        'isBase64Encoded': False
+    }
+
+
+def invoke(handler_path, event):
+    response = get_handler(handler_path)(event, None)
+    status_code = response.get('statusCode', 200)
+    body = response.get('body')
+    if status_code >= 400:
+        raise StepHandlerError(handler_path, status_code, body)
+    return json.loads(body) if isinstance(body, str) else body
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+import logging
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from timing import TIMED_POOL_CLASSES, elapsed_ms
+
+
+logger = logging.getLogger()
+
+
+# Connection pool configuration
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+POOL_BLOCK = os.environ.get("HTTP_POOL_BLOCK", "false").lower() == "true"
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    # adapter whose connections record the duration of every request phase
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+
+
+# one session per host, kept at module level so warm invocations reuse open connections
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            logger.info(f"Creating HTTP session for host: {host}")
+            session = requests.Session()
+            adapter = TimedHTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                pool_block=POOL_BLOCK
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({'Connection': 'keep-alive'})
+            _sessions[host] = session
+    return session
+
+
+def connection_stats(session, url):
+    # total connections opened and requests sent by the pools of this session's adapter
+    pools = session.get_adapter(url).poolmanager.pools
+    connections = 0
+    requests_sent = 0
+    with pools.lock:
+        for pool in pools._container.values():
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+    return {'connections': connections, 'requests': requests_sent}
+
+
+def send(method, url, **kwargs):
+    # send the request over the pooled session of the host and report whether an
+    # already open connection was reused for it along with the duration of each phase
+    session = get_session(url)
+    start = time.perf_counter()
+    response = session.request(method, url, stream=True, **kwargs)
+
+    # the connection stays with the response until its body is read, no other request can use it meanwhile
+    connection = getattr(response.raw, 'connection', None)
+    timings = dict(getattr(connection, 'request_timings', None) or {})
+    reused_connection = getattr(connection, 'reused_connection', None)
+    body_start = time.perf_counter()
+    response.content
+    timings['body'] = elapsed_ms(body_start)
+    timings['wall'] = elapsed_ms(start)
+
+    # totals of the host's pools, shared with the requests sent concurrently
+    totals = connection_stats(session, url)
+    stats = {
+        'host': urlsplit(url).netloc,
+        'reused_connection': reused_connection,
+        'host_requests': totals['requests'],
+        'host_connections': totals['connections']
+    }
+    return response, stats, timings
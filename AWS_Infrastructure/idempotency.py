@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from store import MongoStore, open_store
+
+
+logger = logging.getLogger()
+
+
+# Step response cache configuration: file (local stand-in, per container), mongo or none
+IDEMPOTENCY_BACKEND = os.environ.get("IDEMPOTENCY_BACKEND", "file").lower()
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "3600"))
+# responses kept in memory by the container, the least recently used ones are dropped first
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "512"))
+IDEMPOTENCY_DIR = os.environ.get("IDEMPOTENCY_DIR", "/tmp/step_response_cache")
+IDEMPOTENCY_MONGODB_URI = os.environ.get("IDEMPOTENCY_MONGODB_URI", os.environ.get("MONGODB_URI"))
+IDEMPOTENCY_DATABASE = os.environ.get("IDEMPOTENCY_DATABASE", "clientInfo")
+IDEMPOTENCY_COLLECTION = os.environ.get("IDEMPOTENCY_COLLECTION", "stepResponses")
+
+
+def idempotency_key(client_name, connector, step):
+    # the same step sent twice for the same client and connector has the same key
+    payload_hash = hashlib.sha256(
+        json.dumps(step.get('payload', {}), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+    identity = f"{client_name}/{connector}/{step.get('name')}/{step.get('job_type') or ''}/{payload_hash}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    # completed step responses kept for IDEMPOTENCY_TTL seconds, in memory in front of the store
+    def __init__(self, store, ttl, size=IDEMPOTENCY_CACHE_SIZE):
+        self.store = store
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _keep(self, key, entry):
+        # called with the lock held
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            try:
+                document = self.store.get(key)
+            except Exception:
+                logger.exception(f"Failed to read cached step response {key}")
+                return None
+            if document is None:
+                return None
+            entry = {'response': document['response'], 'expires_at': document['expires_at'].timestamp()}
+            with self._lock:
+                self._keep(key, entry)
+
+        # the TTL monitor of MongoDB only runs once a minute, the file store never expires anything
+        if entry['expires_at'] <= time.time():
+            with self._lock:
+                self._entries.pop(key, None)
+            try:
+                self.store.delete(key)
+            except Exception:
+                logger.exception(f"Failed to delete expired step response {key}")
+            return None
+        return entry['response']
+
+    def put(self, key, response):
+        entry = {'response': response, 'expires_at': time.time() + self.ttl}
+        with self._lock:
+            self._keep(key, entry)
+        try:
+            self.store.put(key, {
+                'response': response,
+                'expires_at': datetime.fromtimestamp(entry['expires_at'], timezone.utc)
+            })
+        except Exception:
+            logger.exception(f"Failed to cache step response {key}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            store = open_store(
+                IDEMPOTENCY_BACKEND, IDEMPOTENCY_DIR, IDEMPOTENCY_MONGODB_URI, IDEMPOTENCY_DATABASE, IDEMPOTENCY_COLLECTION
+            )
+            if store is None:
+                return None
+            if isinstance(store, MongoStore):
+                # expired entries are removed by the server
+                store.collection.create_index('expires_at', expireAfterSeconds=0)
+            _cache = ResponseCache(store, IDEMPOTENCY_TTL)
+    return _cache
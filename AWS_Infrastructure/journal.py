@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+from store import open_store
+
+
+logger = logging.getLogger()
+
+
+# Journal configuration: file (local stand-in, per container), mongo or none
+JOURNAL_BACKEND = os.environ.get("JOURNAL_BACKEND", "file").lower()
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "/tmp/provisioning_journal")
+JOURNAL_MONGODB_URI = os.environ.get("JOURNAL_MONGODB_URI", os.environ.get("MONGODB_URI"))
+JOURNAL_DATABASE = os.environ.get("JOURNAL_DATABASE", "clientInfo")
+JOURNAL_COLLECTION = os.environ.get("JOURNAL_COLLECTION", "provisioningJournal")
+
+
+def plan_hash(setupsteps):
+    canonical = json.dumps(setupsteps, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = open_store(JOURNAL_BACKEND, JOURNAL_DIR, JOURNAL_MONGODB_URI, JOURNAL_DATABASE, JOURNAL_COLLECTION)
+    return _journal
+
+
+class RunJournal:
+    # journal of one provisioning run, keyed by client, connector and plan hash
+    def __init__(self, client_name, connector, setupsteps):
+        self.store = get_journal()
+        self.client_name = client_name
+        self.connector = connector
+        self.plan_hash = plan_hash(setupsteps)
+        self.key = f"{client_name}/{connector}/{self.plan_hash}"
+
+    def completed_steps(self):
+        if self.store is None:
+            return {}
+        steps = (self.store.get(self.key) or {}).get('steps', {})
+        return {step_key: entry.get('result') for step_key, entry in steps.items()}
+
+    def record_step(self, step_key, result):
+        if self.store is None:
+            return
+        try:
+            self.store.update(self.key, {
+                f'steps.{step_key}': {'result': result, 'completed_at': datetime.now(timezone.utc)},
+                'client': self.client_name,
+                'connector': self.connector,
+                'plan_hash': self.plan_hash
+            })
+        except Exception:
+            logger.exception(f"Failed to record step {step_key} in the journal")
+
+    def clear(self):
+        if self.store is not None:
+            self.store.delete(self.key)
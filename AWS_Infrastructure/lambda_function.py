@@ -1,7 +1,24 @@
 import os
 import json
-import requests
+import time
+import asyncio
 import logging
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import Timeout
+import http_session
+import dispatch
+from timing import elapsed_ms, emit_step_metrics
+from retries import call_with_retries, call_with_retries_async
+from async_http import AsyncHTTPClient
+from journal import RunJournal
+from idempotency import get_response_cache, idempotency_key
+from deadline import Deadline, DeadlineExceeded
+from scheduler import run_step_graph, run_step_graph_async
+from plan import compile_plan, describe_plan, record_duration, estimate_ms
+from plan_registry import PLANS_DIR, load_registry, deep_merge
+from progress import EventLog, EVENT_LOG_FORMATS, CONTENT_TYPES
 
 
 logger = logging.getLogger()
@@ -9,45 +26,81 @@ logger.setLevel(logging.INFO)
 
 
 ACCESS_KEY = os.environ.get("ACCESS_KEY")
+# Number of independent steps executed at the same time
+MAX_PARALLEL_STEPS = int(os.environ.get("MAX_PARALLEL_STEPS", "8"))
+# Default execution mode: sequential, parallel or async
+EXECUTION_MODE = os.environ.get("EXECUTION_MODE", "parallel")
+# Number of step calls in flight at the same time in async mode
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("ASYNC_MAX_CONCURRENCY", "100"))
+EXECUTION_MODES = ('sequential', 'parallel', 'async')
+# Step dispatch: http (through API Gateway) or in_process (handlers imported in this function)
+STEP_DISPATCH = os.environ.get("STEP_DISPATCH", "http")
+STEP_DISPATCH_MODES = ('http', 'in_process')
+# Bulk mode: clients provisioned at the same time and step calls in flight across all clients
+BULK_MAX_CLIENTS = int(os.environ.get("BULK_MAX_CLIENTS", "10"))
+BULK_MAX_CONCURRENT_STEPS = int(os.environ.get("BULK_MAX_CONCURRENT_STEPS", "50"))
 # API Headers
 headers = {
     'AccessKey': ACCESS_KEY
 }
 
 
-# Map each step name to its corresponding service URL
+# Map each step name to its corresponding service URL, the steps it depends on
+# and the handler called for it when steps are dispatched in process.
+# GET steps are retried on any transient failure, POST steps only when marked idempotent.
+# required_payload lists the payload fields the step handler rejects the request without
 STEP_URL_CONFIG = {
     "create_configuration": {
         "url": "https://9eaalgwdl5.execute-api.ap-south-1.amazonaws.com/prod/init/{client}/{connector}",
-        "method": "GET"
+        "method": "GET",
+        "depends_on": [],
+        "handler": "Create_Config_Mongo.lambda_function.lambda_handler"
     },
     "create_collections": {
         "url": "https://s2emxkbodf.execute-api.ap-south-1.amazonaws.com/prod/init/{client}/{connector}",
-        "method": "POST"
+        "method": "POST",
+        "depends_on": ["create_configuration"],
+        "handler": "Create_Connector_Collection_Mongo.lambda_function.lambda_handler",
+        "required_payload": {"collections": list}
     },
     "create_s3_bucket": {
         "url": "https://m890ytvhy4.execute-api.ap-south-1.amazonaws.com/prod/init/{client}",
-        "method": "POST"
+        "method": "POST",
+        "depends_on": ["create_configuration"],
+        "handler": "Create_S3_Bucket.lambda_function.lambda_handler",
+        "idempotent": True
     },
     "create_compute_environment": {
         "url": "https://i8c4gggymd.execute-api.ap-south-1.amazonaws.com/prod/init/{client}/{connector}",
-        "method": "GET"
+        "method": "GET",
+        "depends_on": ["create_configuration"],
+        "handler": "Create_Compute_Environment.lambda_function.lambda_handler"
     },
     "create_job_queue": {
         "url": "https://yarbf8k83a.execute-api.ap-south-1.amazonaws.com/prod/init/{client}/{connector}",
-        "method": "GET"
+        "method": "GET",
+        "depends_on": ["create_compute_environment"],
+        "handler": "Create_Job_Queue.lambda_function.lambda_handler"
     },
     "create_job_definition": {
         "url": "https://4li7upsuzh.execute-api.ap-south-1.amazonaws.com/prod/init/{client}/{connector}",
-        "method": "GET"
+        "method": "GET",
+        "depends_on": ["create_configuration"],
+        "handler": "Create_Job_Definition.lambda_function.lambda_handler"
     },
     "check_feed_status": {
         "url": "https://s97690e06j.execute-api.ap-south-1.amazonaws.com/default/init/{job_type}/{client}/{connector}",
-        "method": "POST"
+        "method": "POST",
+        "depends_on": ["create_job_queue", "create_job_definition"],
+        "handler": "Create_Job.lambda_function.lambda_handler",
+        "idempotent": True,
+        "required_payload": {"command": list}
     },
     "create_db_mapping": {
         "url": "https://kw0eegth7g.execute-api.ap-south-1.amazonaws.com/prod/init/{client}",
-        "method": "GET"
+        "method": "GET",
+        "depends_on": ["create_configuration"],
+        "handler": "Create_DB_Mapping.lambda_function.lambda_handler"
     }
 }
 
@@ -60,14 +113,528 @@ cors_headers = {
 }
 
 
+def build_step_request(step, client_name, connector):
+    step_name = step.get('name')
+    job_type = step.get('job_type')
+    payload = step.get('payload', {})
+
+    config = STEP_URL_CONFIG[step_name]
+    url = config['url'].format(
+        client=client_name,
+        connector=connector or "",
+        job_type=job_type or ""
+    )
+
+    return step_name, config['method'].upper(), url, payload
+
+
+def step_headers(client_name, options):
+    # the handlers caching the configuration document read it again once this run wrote it
+    if client_name in options['config_written']:
+        return {**headers, 'Cache-Control': 'no-cache'}
+    return headers
+
+
+def mark_config_written(step, client_name, timing, options):
+    if step.get('name') == 'create_configuration' and timing['dispatch'] != 'cache':
+        options['config_written'].add(client_name)
+
+
+def step_retry_target(step, client_name, connector, options):
+    # host the retry state is kept for and whether the step can safely be sent again
+    step_name, method, url, _ = build_step_request(step, client_name, connector)
+    config = STEP_URL_CONFIG[step_name]
+    idempotent = config.get('idempotent', method == 'GET')
+    if options['dispatch'] == 'in_process':
+        return f"in_process:{config['handler']}", idempotent
+    return urlsplit(url).netloc, idempotent
+
+
+def cached_response(step, client_name, connector, options):
+    # the response of the same step completed by an earlier request, as long as it has not expired
+    cache = get_response_cache()
+    if cache is None or not options['use_cache']:
+        return None
+    return cache.get(idempotency_key(client_name, connector, step))
+
+
+def cache_response(step, client_name, connector, result):
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(idempotency_key(client_name, connector, step), result)
+
+
+def cached_timing(step, start):
+    logger.info(f"Step {step.get('name')} answered from cache")
+    return {'step': step.get('name'), 'dispatch': 'cache', 'wall': elapsed_ms(start), 'attempts': 0}
+
+
+def raise_if_deadline_reached(step, options, error):
+    # a call cut short by the budget of the deadline stops the run instead of failing it
+    if options['deadline'].expired():
+        raise DeadlineExceeded(f"Step {step.get('name')} did not complete before the deadline: {error}") from error
+
+
+def execute_step_with_retries(step, client_name, connector, options, step_limiter=None):
+    start = time.perf_counter()
+    result = cached_response(step, client_name, connector, options)
+    if result is not None:
+        return result, cached_timing(step, start)
+
+    host, idempotent = step_retry_target(step, client_name, connector, options)
+
+    def attempt():
+        options['deadline'].check(step.get('name'))
+        # the bulk limiter is only held while a call is in flight, not during the backoff
+        if step_limiter is None:
+            return execute_step(step, client_name, connector, options)
+        with step_limiter:
+            return execute_step(step, client_name, connector, options)
+
+    try:
+        (result, timing), attempts = call_with_retries(host, idempotent, attempt, options['deadline'])
+    except (Timeout, asyncio.TimeoutError) as e:
+        raise_if_deadline_reached(step, options, e)
+        raise
+    timing['attempts'] = attempts
+    cache_response(step, client_name, connector, result)
+    return result, timing
+
+
+async def execute_step_with_retries_async(http_client, step, client_name, connector, options):
+    start = time.perf_counter()
+    result = await asyncio.to_thread(cached_response, step, client_name, connector, options)
+    if result is not None:
+        return result, cached_timing(step, start)
+
+    host, idempotent = step_retry_target(step, client_name, connector, options)
+
+    async def attempt():
+        options['deadline'].check(step.get('name'))
+        return await execute_step_async(http_client, step, client_name, connector, options)
+
+    try:
+        (result, timing), attempts = await call_with_retries_async(host, idempotent, attempt, options['deadline'])
+    except (Timeout, asyncio.TimeoutError) as e:
+        raise_if_deadline_reached(step, options, e)
+        raise
+    timing['attempts'] = attempts
+    await asyncio.to_thread(cache_response, step, client_name, connector, result)
+    return result, timing
+
+
+def execute_step_in_process(step, client_name, connector, options):
+    step_name, method, _, payload = build_step_request(step, client_name, connector)
+    config = STEP_URL_CONFIG[step_name]
+    path_params = {'client': client_name, 'connector': connector, 'job_type': step.get('job_type') or ""}
+
+    logger.info(f"Executing step in process: {step_name}")
+    start = time.perf_counter()
+    event = dispatch.build_event(config['url'], method, path_params, payload, step_headers(client_name, options))
+    result = dispatch.invoke(config['handler'], event)
+    timing = {'step': step_name, 'dispatch': 'in_process', 'wall': elapsed_ms(start)}
+    logger.info(f"Step {step_name} response: {result}")
+    return result, timing
+
+
+def execute_step(step, client_name, connector, options):
+    # returns the step response and the duration of the step and of its request phases
+    if options['dispatch'] == 'in_process':
+        return execute_step_in_process(step, client_name, connector, options)
+
+    step_name, method, url, payload = build_step_request(step, client_name, connector)
+    request_headers = step_headers(client_name, options)
+
+    logger.info(f"Executing step: {step_name}")
+    # choose HTTP method and create request
+    match method:
+        case 'GET':
+            response, connection, timings = http_session.send(
+                'GET', url, headers=request_headers, timeout=options['deadline'].step_timeout()
+            )
+        case 'POST':
+            response, connection, timings = http_session.send(
+                'POST', url, json=payload, headers=request_headers, timeout=options['deadline'].step_timeout()
+            )
+
+    logger.info(f"Step {step_name} connection: {connection}")
+    response.raise_for_status()
+    result = response.json()
+    logger.info(f"Step {step_name} response: {result}")
+    timing = {'step': step_name, 'dispatch': 'http', 'reused_connection': connection['reused_connection'], **timings}
+    return result, timing
+
+
+async def execute_step_async(http_client, step, client_name, connector, options):
+    if options['dispatch'] == 'in_process':
+        # the handlers are blocking, run them off the event loop
+        return await asyncio.to_thread(execute_step_in_process, step, client_name, connector, options)
+
+    step_name, method, url, payload = build_step_request(step, client_name, connector)
+    request_headers = step_headers(client_name, options)
+
+    logger.info(f"Executing step: {step_name}")
+    match method:
+        case 'GET':
+            response = await http_client.request('GET', url, headers=request_headers, timeout=options['deadline'].step_timeout())
+        case 'POST':
+            response = await http_client.request(
+                'POST', url, headers=request_headers, json_body=payload, timeout=options['deadline'].step_timeout()
+            )
+
+    connection = {'host': response.host, 'reused_connection': response.reused_connection}
+    logger.info(f"Step {step_name} connection: {connection}")
+    response.raise_for_status()
+    result = response.json()
+    logger.info(f"Step {step_name} response: {result}")
+    timing = {'step': step_name, 'dispatch': 'http', 'reused_connection': response.reused_connection, **response.timings}
+    return result, timing
+
+
+def record_step(journal, timings, step_key, result, timing, client_name, connector):
+    journal.record_step(step_key, result)
+    timings[step_key] = timing
+    if timing['dispatch'] != 'cache':
+        record_duration(timing['step'], timing['wall'])
+    emit_step_metrics(client_name, connector, step_key, timing)
+    logger.info(f"Step {step_key} timing: {timing}")
+
+
+def resume_from_journal(journal, step_graph, resume):
+    # drop the steps already completed by a previous run of the same plan
+    if not resume:
+        journal.clear()
+        return {}, step_graph
+
+    completed = journal.completed_steps()
+    if completed:
+        logger.info(f"Resuming provisioning, skipping completed steps: {sorted(completed)}")
+
+    remaining_graph = {
+        step_key: dependencies - completed.keys()
+        for step_key, dependencies in step_graph.items()
+        if step_key not in completed
+    }
+    return completed, remaining_graph
+
+
+def start_run(progress, setupsteps, step_graph, client_name, connector, options):
+    journal = RunJournal(client_name, connector, setupsteps)
+    completed, remaining_graph = resume_from_journal(journal, step_graph, options['resume'])
+    progress.run_started(client_name, connector, sorted(remaining_graph))
+    progress.steps_skipped(client_name, connector, completed)
+    return journal, completed, remaining_graph
+
+
+def stop_run(progress, journal, remaining_graph, completed, timings, client_name, connector, start, error):
+    # the completed steps are kept in the journal, the same request sent again resumes from them
+    pending = sorted(remaining_graph.keys() - timings.keys())
+    logger.warning(f"Stopping provisioning of {client_name}/{connector}: {error}, pending steps: {pending}")
+    progress.run_finished(client_name, connector, elapsed_ms(start), pending_steps=pending)
+    results = {step_key: result for step_key, result in journal.completed_steps().items() if step_key in timings}
+    return {'skipped_steps': completed, 'results': results, 'timings': timings, 'pending_steps': pending, 'total_ms': elapsed_ms(start)}
+
+
+def start_step(progress, step, step_key, client_name, connector):
+    progress.step_started(client_name, connector, step_key, step['name'], estimate_ms(step['name']))
+
+
+async def run_client_steps_async(http_client, setupsteps, step_graph, client_name, connector, options, progress):
+    start = time.perf_counter()
+    journal, completed, remaining_graph = start_run(progress, setupsteps, step_graph, client_name, connector, options)
+    timings = {}
+
+    async def run_step(step_key):
+        start_step(progress, setupsteps[step_key], step_key, client_name, connector)
+        try:
+            result, timing = await execute_step_with_retries_async(http_client, setupsteps[step_key], client_name, connector, options)
+        except Exception as e:
+            progress.step_failed(client_name, connector, step_key, e)
+            raise
+        mark_config_written(setupsteps[step_key], client_name, timing, options)
+        await asyncio.to_thread(record_step, journal, timings, step_key, result, timing, client_name, connector)
+        progress.step_finished(client_name, connector, step_key, timing)
+        return result
+
+    try:
+        results = await run_step_graph_async(remaining_graph, run_step)
+    except DeadlineExceeded as e:
+        return stop_run(progress, journal, remaining_graph, completed, timings, client_name, connector, start, e)
+    except Exception as e:
+        progress.run_finished(client_name, connector, elapsed_ms(start), error=e)
+        raise
+
+    journal.clear()
+    progress.run_finished(client_name, connector, elapsed_ms(start))
+    return {'skipped_steps': completed, 'results': results, 'timings': timings, 'pending_steps': [], 'total_ms': elapsed_ms(start)}
+
+
+async def run_steps_async(setupsteps, step_graph, client_name, connector, options, progress):
+    http_client = AsyncHTTPClient(max_concurrency=ASYNC_MAX_CONCURRENCY)
+    try:
+        return await run_client_steps_async(http_client, setupsteps, step_graph, client_name, connector, options, progress)
+    finally:
+        await http_client.close()
+
+
+def run_steps(setupsteps, step_graph, client_name, connector, options, step_limiter=None, progress=None):
+    # returns the results of the steps skipped from the journal, of the steps executed and their timings
+    progress = progress or EventLog()
+    if options['execution_mode'] == 'async':
+        return asyncio.run(run_steps_async(setupsteps, step_graph, client_name, connector, options, progress))
+
+    start = time.perf_counter()
+    journal, completed, remaining_graph = start_run(progress, setupsteps, step_graph, client_name, connector, options)
+    timings = {}
+
+    def run_step(step_key):
+        start_step(progress, setupsteps[step_key], step_key, client_name, connector)
+        try:
+            result, timing = execute_step_with_retries(setupsteps[step_key], client_name, connector, options, step_limiter)
+        except Exception as e:
+            progress.step_failed(client_name, connector, step_key, e)
+            raise
+        mark_config_written(setupsteps[step_key], client_name, timing, options)
+        record_step(journal, timings, step_key, result, timing, client_name, connector)
+        progress.step_finished(client_name, connector, step_key, timing)
+        return result
+
+    try:
+        match options['execution_mode']:
+            case 'sequential':
+                # one step after another in step key order, ignoring the dependencies
+                results = {step_key: run_step(step_key) for step_key in sorted(remaining_graph.keys())}
+            case 'parallel':
+                results = run_step_graph(remaining_graph, run_step, max_workers=MAX_PARALLEL_STEPS)
+    except DeadlineExceeded as e:
+        return stop_run(progress, journal, remaining_graph, completed, timings, client_name, connector, start, e)
+    except Exception as e:
+        progress.run_finished(client_name, connector, elapsed_ms(start), error=e)
+        raise
+
+    # the run is complete, a new request with the same plan starts from the first step again
+    journal.clear()
+    progress.run_finished(client_name, connector, elapsed_ms(start))
+    return {'skipped_steps': completed, 'results': results, 'timings': timings, 'pending_steps': [], 'total_ms': elapsed_ms(start)}
+
+
+def compile_steps(setupsteps, client_name, connector):
+    # check every step before anything is executed and return the execution plan
+    def render_url(step):
+        return build_step_request(step, client_name, connector)[2]
+
+    return compile_plan(setupsteps, STEP_URL_CONFIG, render_url)
+
+
+def compile_template(setupsteps):
+    # plans of the registry are compiled once, with the urls left as templates
+    return compile_plan(setupsteps, STEP_URL_CONFIG, lambda step: STEP_URL_CONFIG[step['name']]['url'])
+
+
+# Named plans loaded and validated once per container
+PLAN_REGISTRY = load_registry(PLANS_DIR, compile_template)
+
+
+def resolve_steps(source, client_name, connector, options):
+    # returns the setupsteps of the request and their execution plan. a request either sends
+    # its setupsteps or names a plan of the registry along with overrides merged into it
+    plan_name = source.get('plan')
+    if plan_name is None:
+        setupsteps = source.get('setupsteps', {})
+        return setupsteps, compile_steps(setupsteps, client_name, connector)
+
+    if 'setupsteps' in source:
+        raise ValueError('Send either a plan or setupsteps, not both')
+
+    plan_name, entry = PLAN_REGISTRY.get(plan_name)
+    overrides = source.get('overrides')
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError('overrides must be an object')
+
+    if not overrides and not options['dry_run']:
+        # validated when the container started, nothing left to check
+        logger.info(f"Using plan {plan_name}")
+        return entry['setupsteps'], entry['compiled']
+
+    logger.info(f"Using plan {plan_name} with overrides: {overrides}")
+    setupsteps = deep_merge(entry['setupsteps'], overrides or {})
+    return setupsteps, compile_steps(setupsteps, client_name, connector)
+
+
+def bulk_run_result(run):
+    if run['pending_steps']:
+        return {'status': 'INCOMPLETE', 'pending_steps': run['pending_steps'], 'total_ms': run['total_ms']}
+    return {'status': 'SUCCEEDED', 'total_ms': run['total_ms']}
+
+
+def provision_bulk(entries, defaults, options, progress=None):
+    # provision every client/connector pair of the batch. failures are reported per
+    # entry and never abort the other entries of the batch
+    results = []
+    prepared = []
+    for entry in entries:
+        client_name = (entry.get('client') or '').lower()
+        connector = (entry.get('connector') or '').lower()
+        result = {'client': client_name, 'connector': connector}
+        results.append(result)
+
+        if not client_name or not connector:
+            result.update({'status': 'FAILED', 'error': 'client and connector are required'})
+            continue
+
+        # an entry with its own plan or setupsteps does not inherit the ones of the batch
+        source = entry if 'plan' in entry or 'setupsteps' in entry else {**defaults, **entry}
+        try:
+            setupsteps, plan = resolve_steps(source, client_name, connector, options)
+        except ValueError as e:
+            result.update({'status': 'FAILED', 'error': str(e)})
+            continue
+
+        if options['dry_run']:
+            result.update({'status': 'PLANNED', 'plan': describe_plan(plan)})
+            continue
+
+        prepared.append((result, setupsteps, plan['graph']))
+
+    logger.info(f"Bulk provisioning of {len(prepared)} clients with options: {options}")
+
+    progress = progress or EventLog()
+    if options['execution_mode'] == 'async':
+        asyncio.run(provision_bulk_async(prepared, options, progress))
+    else:
+        # every client runs on its own worker while the semaphore caps the step calls in flight
+        step_limiter = threading.BoundedSemaphore(BULK_MAX_CONCURRENT_STEPS)
+
+        def provision(result, setupsteps, step_graph):
+            try:
+                run = run_steps(setupsteps, step_graph, result['client'], result['connector'], options, step_limiter, progress)
+                result.update(bulk_run_result(run))
+            except Exception as e:
+                logger.error(f"Provisioning of {result['client']}/{result['connector']} failed: {e}")
+                result.update({'status': 'FAILED', 'error': str(e)})
+
+        with ThreadPoolExecutor(max_workers=BULK_MAX_CLIENTS) as executor:
+            for item in prepared:
+                executor.submit(provision, *item)
+
+    # counted by status, a dry run only plans the entries
+    statuses = [result['status'] for result in results]
+    summary = {
+        'total': len(results),
+        'succeeded': statuses.count('SUCCEEDED'),
+        'failed': statuses.count('FAILED'),
+        'incomplete': statuses.count('INCOMPLETE'),
+        'planned': statuses.count('PLANNED')
+    }
+    progress.bulk_finished(summary)
+    return {
+        'summary': summary,
+        'results': results
+    }
+
+
+async def provision_bulk_async(prepared, options, progress):
+    # one event loop and one client for the whole batch, the client caps the calls in flight
+    http_client = AsyncHTTPClient(max_concurrency=BULK_MAX_CONCURRENT_STEPS)
+
+    async def provision(result, setupsteps, step_graph):
+        try:
+            run = await run_client_steps_async(
+                http_client, setupsteps, step_graph, result['client'], result['connector'], options, progress
+            )
+            result.update(bulk_run_result(run))
+        except Exception as e:
+            logger.error(f"Provisioning of {result['client']}/{result['connector']} failed: {e}")
+            result.update({'status': 'FAILED', 'error': str(e)})
+
+    try:
+        await asyncio.gather(*(provision(*item) for item in prepared))
+    finally:
+        await http_client.close()
+
+
+def event_log_response(status_code, progress):
+    # the events of the finished run as the body, one line per event (ndjson) or server-sent events (sse)
+    return {
+        'statusCode': status_code,
+        'headers': {**cors_headers, 'Content-Type': CONTENT_TYPES[progress.log_format]},
+        'body': progress.render()
+    }
+
+
 def lambda_handler(event, context):
     try:
         # extract path parameters
-        path_params = event.get("pathParameters", {})
+        path_params = event.get("pathParameters") or {}
         client_name = path_params.get("client")
         connector = path_params.get("connector")
         body = event.get('body')
 
+        if isinstance(body, str):
+            body = json.loads(body)
+        body = body or {}
+
+        options = {
+            'execution_mode': body.get('execution_mode', EXECUTION_MODE).lower(),
+            'dispatch': body.get('dispatch', STEP_DISPATCH).lower(),
+            # skip the steps completed by a previous failed run of the same plan
+            'resume': body.get('resume', True),
+            # only compile and return the execution plan, no step is called
+            'dry_run': body.get('dry_run', False),
+            # return the event log of the run instead of the summary once it is over: ndjson or sse
+            'event_log': (body.get('event_log') or '').lower() or None,
+            # answer the steps already completed by an earlier request from the response cache
+            'use_cache': body.get('use_cache', True),
+            # the run stops and checkpoints before the Lambda timeout, each call gets the time left
+            'deadline': Deadline.from_context(context),
+            # clients whose configuration document was written by this request
+            'config_written': set()
+        }
+
+        if options['execution_mode'] not in EXECUTION_MODES:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f"Unsupported execution mode: {options['execution_mode']}"})
+            }
+
+        if options['dispatch'] not in STEP_DISPATCH_MODES:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f"Unsupported dispatch: {options['dispatch']}"})
+            }
+
+        if options['event_log'] and options['event_log'] not in EVENT_LOG_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f"Unsupported event log format: {options['event_log']}"})
+            }
+
+        progress = EventLog(options['event_log'])
+
+        # bulk mode: provision a list of client/connector pairs in one invocation
+        if 'clients' in body:
+            entries = body.get('clients')
+            if not isinstance(entries, list) or not entries:
+                return {
+                    'statusCode': 400,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': 'clients must be a non-empty list of client/connector pairs'})
+                }
+
+            defaults = {key: body[key] for key in ('plan', 'overrides', 'setupsteps') if key in body}
+            bulk_result = provision_bulk(entries, defaults, options, progress)
+            if options['event_log'] and not options['dry_run']:
+                return event_log_response(200, progress)
+
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': json.dumps(bulk_result)
+            }
+
         if not client_name or not connector:
             logger.warning("Missing path parameters")
             return {
@@ -78,55 +645,54 @@ def lambda_handler(event, context):
         
         client_name = client_name.lower()
         connector = connector.lower()
-        
-        if isinstance(body, str):
-            body = json.loads(body)
-        
-        setupsteps = body.get('setupsteps', {})
 
-        for step_key in sorted(setupsteps.keys()):
-            step = setupsteps[step_key]
-            step_name = step.get('name')
-            job_type = step.get('job_type')
-            payload = step.get('payload', {})
+        try:
+            setupsteps, plan = resolve_steps(body, client_name, connector, options)
+        except ValueError as e:
+            logger.warning(f"Invalid setup steps: {e}")
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': str(e)})
+            }
 
-            config = STEP_URL_CONFIG.get(step_name)
-            if not config:
-                return {
-                    'statusCode': 400,
-                    'headers': cors_headers,
-                    'body': json.dumps({'error': f'No config found for step: {step_name}'})
-                }
-            
-            url = config['url'].format(
-                client=client_name,
-                connector=connector or "",
-                job_type=job_type or ""
-            )
+        if options['dry_run']:
+            logger.info(f"Dry run, execution plan: {describe_plan(plan)}")
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': json.dumps({'message': 'Dry run, no step executed', 'plan': describe_plan(plan)})
+            }
+
+        logger.info(f"Executing steps with options: {options} and levels: {plan['levels']}")
+        try:
+            run = run_steps(setupsteps, plan['graph'], client_name, connector, options, progress=progress)
+        except Exception:
+            if not options['event_log']:
+                raise
+            # the failed step and the error are in the events
+            return event_log_response(500, progress)
 
-            method = config['method'].upper()
-
-            logger.info(f"Executing step: {step_name}")
-            # choose HTTP method and create request
-            match method:
-                case 'GET':
-                    response = requests.get(url=url, headers=headers)
-                case 'POST':
-                    response = requests.post(url=url, json=payload, headers=headers)
-                case _:
-                    return {
-                        'statusCode': 400,
-                        'headers': cors_headers,
-                        'body': json.dumps({'error': f'Unsupported HTTP method: {method}'})
-                    }
-            
-            response.raise_for_status()
-            logger.info(f"Step {step_name} response: {response.json()}")
+        # 202 when the deadline stopped the run, the same request sent again completes it
+        status_code = 202 if run['pending_steps'] else 200
+        if options['event_log']:
+            return event_log_response(status_code, progress)
+
+        response_body = {
+            'message': 'All steps executed successfully',
+            'total_ms': run['total_ms'],
+            'timings': run['timings']
+        }
+        if run['skipped_steps']:
+            response_body['skipped_steps'] = sorted(run['skipped_steps'])
+        if run['pending_steps']:
+            response_body['message'] = 'Deadline reached, provisioning stopped before completion'
+            response_body['pending_steps'] = run['pending_steps']
 
         return {
-            'statusCode': 200,
+            'statusCode': status_code,
             'headers': cors_headers,
-            'body': json.dumps({'message': 'All steps executed successfully'})
+            'body': json.dumps(response_body)
         }
         
     except Exception as e:
@@ -0,0 +1,145 @@
+import string
+import logging
+import statistics
+import threading
+from collections import deque
+
+from journal import plan_hash
+from scheduler import build_step_graph, topological_levels
+
+
+logger = logging.getLogger()
+
+
+# Step durations used when the container has not run a step yet
+DEFAULT_STEP_ESTIMATES_MS = {
+    "create_configuration": 800,
+    "create_collections": 3000,
+    "create_s3_bucket": 1500,
+    "create_compute_environment": 1500,
+    "create_job_queue": 1200,
+    "create_job_definition": 1000,
+    "check_feed_status": 1000,
+    "create_db_mapping": 700
+}
+FALLBACK_ESTIMATE_MS = 1000
+# Number of recent durations kept per step name
+HISTORY_SIZE = 50
+
+
+# wall times of the steps executed by this container, the estimates follow the real latencies once warm
+_history = {}
+_history_lock = threading.Lock()
+
+
+def record_duration(step_name, wall_ms):
+    with _history_lock:
+        _history.setdefault(step_name, deque(maxlen=HISTORY_SIZE)).append(wall_ms)
+
+
+def estimate_ms(step_name):
+    with _history_lock:
+        durations = list(_history.get(step_name, ()))
+    if durations:
+        return round(statistics.median(durations), 2)
+    return DEFAULT_STEP_ESTIMATES_MS.get(step_name, FALLBACK_ESTIMATE_MS)
+
+
+def url_fields(url_template):
+    return {field for _, field, _, _ in string.Formatter().parse(url_template) if field}
+
+
+def validate_step(step_key, step, step_config):
+    # everything a step needs to be sent, so a malformed plan fails before the first call
+    if not isinstance(step, dict):
+        raise ValueError(f'Step {step_key} must be an object')
+
+    step_name = step.get('name')
+    config = step_config.get(step_name)
+    if not config:
+        raise ValueError(f'No config found for step: {step_name}')
+
+    method = config['method'].upper()
+    if method not in ('GET', 'POST'):
+        raise ValueError(f'Unsupported HTTP method: {method}')
+
+    if 'job_type' in url_fields(config['url']) and not step.get('job_type'):
+        raise ValueError(f'Missing job_type for step: {step_key}')
+
+    payload = step.get('payload', {})
+    if not isinstance(payload, dict):
+        raise ValueError(f'Payload of step {step_key} must be an object')
+
+    for field, field_type in config.get('required_payload', {}).items():
+        if not payload.get(field):
+            raise ValueError(f'Missing {field} in payload of step: {step_key}')
+        if not isinstance(payload[field], field_type):
+            raise ValueError(f'{field} in payload of step {step_key} must be a {field_type.__name__}')
+
+
+def critical_path(step_graph, levels, estimates):
+    # longest chain of dependent steps, the run can not finish before it does
+    finish = {}
+    previous = {}
+    for level in levels:
+        for step_key in level:
+            dependencies = sorted(step_graph[step_key])
+            slowest = max(dependencies, key=lambda dependency: finish[dependency], default=None)
+            previous[step_key] = slowest
+            finish[step_key] = (finish[slowest] if slowest else 0) + estimates[step_key]
+
+    if not finish:
+        return [], 0
+
+    step_key = max(sorted(finish), key=lambda key: finish[key])
+    total = finish[step_key]
+    path = []
+    while step_key:
+        path.append(step_key)
+        step_key = previous[step_key]
+    return path[::-1], round(total, 2)
+
+
+def compile_plan(setupsteps, step_config, render_url):
+    # validate the steps, render their requests and lay out the dependency graph
+    # without calling anything. render_url(step) returns the url the step is sent to
+    if not isinstance(setupsteps, dict):
+        raise ValueError('setupsteps must be an object')
+
+    for step_key in sorted(setupsteps.keys()):
+        validate_step(step_key, setupsteps[step_key], step_config)
+
+    default_dependencies = {name: config.get('depends_on', []) for name, config in step_config.items()}
+    step_graph = build_step_graph(setupsteps, default_dependencies)
+    levels = topological_levels(step_graph)
+
+    steps = {}
+    estimates = {}
+    for step_key in sorted(setupsteps.keys()):
+        step = setupsteps[step_key]
+        config = step_config[step['name']]
+        estimates[step_key] = estimate_ms(step['name'])
+        steps[step_key] = {
+            'name': step['name'],
+            'method': config['method'].upper(),
+            'url': render_url(step),
+            'handler': config.get('handler'),
+            'depends_on': sorted(step_graph[step_key]),
+            'estimated_ms': estimates[step_key]
+        }
+
+    path, critical_ms = critical_path(step_graph, levels, estimates)
+    return {
+        'plan_hash': plan_hash(setupsteps),
+        'steps': steps,
+        'levels': levels,
+        'critical_path': path,
+        'estimated_ms': critical_ms,
+        'estimated_sequential_ms': round(sum(estimates.values()), 2),
+        'graph': step_graph
+    }
+
+
+def describe_plan(plan):
+    # the plan as returned to the caller, the graph is already listed in the steps
+    return {name: value for name, value in plan.items() if name != 'graph'}
@@ -0,0 +1,70 @@
+import os
+import re
+import json
+import logging
+
+
+logger = logging.getLogger()
+
+
+# Directory of the named plans, one <connector>@v<version>.json file per plan
+PLANS_DIR = os.environ.get("PLANS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "plans"))
+
+PLAN_NAME_PATTERN = re.compile(r'^(?P<base>[a-z0-9_\-]+)@v(?P<version>\d+)$')
+
+
+def deep_merge(base, overrides):
+    # objects are merged key by key, any other value replaces the base one and null removes the key
+    merged = dict(base)
+    for key, value in overrides.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class PlanRegistry:
+    def __init__(self, plans):
+        self.plans = plans
+        # a name without version resolves to the latest version of the plan
+        self.latest = {}
+        for name in sorted(plans, key=lambda name: int(PLAN_NAME_PATTERN.match(name)['version'])):
+            self.latest[PLAN_NAME_PATTERN.match(name)['base']] = name
+
+    def get(self, name):
+        # returns the full plan name and its entry {'setupsteps', 'compiled'}
+        name = (name or '').lower()
+        full_name = name if name in self.plans else self.latest.get(name)
+        if full_name is None:
+            raise ValueError(f"Unknown plan: {name}, available plans: {', '.join(sorted(self.plans))}")
+        return full_name, self.plans[full_name]
+
+
+def load_registry(directory, compile_template):
+    # read and compile every plan once per container. invalid plans are left out of the
+    # registry so the other plans keep working
+    plans = {}
+    file_names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+    for file_name in file_names:
+        name, extension = os.path.splitext(file_name)
+        if extension != '.json':
+            continue
+        if not PLAN_NAME_PATTERN.match(name):
+            logger.error(f"Skipping plan file with an invalid name: {file_name}")
+            continue
+
+        try:
+            with open(os.path.join(directory, file_name), 'r') as f:
+                setupsteps = json.load(f)['setupsteps']
+            compiled = compile_template(setupsteps)
+        except (OSError, KeyError, ValueError) as e:
+            logger.error(f"Skipping invalid plan {name}: {e}")
+            continue
+
+        plans[name] = {'setupsteps': setupsteps, 'compiled': compiled}
+
+    logger.info(f"Loaded plans: {sorted(plans)}")
+    return PlanRegistry(plans)
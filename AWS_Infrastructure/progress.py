@@ -0,0 +1,88 @@
+import json
+import time
+import threading
+
+from timing import elapsed_ms
+
+
+EVENT_LOG_FORMATS = ('ndjson', 'sse')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+
+class EventLog:
+    # one compact event per run and step transition. the events are printed as soon as they
+    # happen so the log shows the progress live. render() returns them all in the log format once
+    # the run is over, it is a record of the run and not a stream: the Python runtime has no
+    # Lambda response streaming
+    def __init__(self, log_format=None):
+        self.log_format = log_format
+        self.events = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def emit(self, event_type, **fields):
+        event = {'event': event_type, 't_ms': elapsed_ms(self.start), **fields}
+        with self._lock:
+            self.events.append(event)
+            if self.log_format:
+                # printed rather than logged so every line is a valid event
+                print(json.dumps(event, separators=(',', ':')), flush=True)
+
+    def run_started(self, client_name, connector, steps):
+        self.emit('run_start', client=client_name, connector=connector, steps=steps)
+
+    def steps_skipped(self, client_name, connector, step_keys):
+        for step_key in sorted(step_keys):
+            self.emit('step_skip', client=client_name, connector=connector, step=step_key)
+
+    def step_started(self, client_name, connector, step_key, step_name, estimated_ms):
+        # the estimate lets the caller time out a single step instead of the whole run
+        self.emit(
+            'step_start',
+            client=client_name,
+            connector=connector,
+            step=step_key,
+            name=step_name,
+            estimated_ms=estimated_ms
+        )
+
+    def step_finished(self, client_name, connector, step_key, timing):
+        self.emit(
+            'step_end',
+            client=client_name,
+            connector=connector,
+            step=step_key,
+            status='SUCCEEDED',
+            wall_ms=timing.get('wall'),
+            attempts=timing.get('attempts', 1)
+        )
+
+    def step_failed(self, client_name, connector, step_key, error):
+        self.emit('step_end', client=client_name, connector=connector, step=step_key, status='FAILED', error=str(error))
+
+    def run_finished(self, client_name, connector, total_ms, error=None, pending_steps=None):
+        if error is not None:
+            fields = {'status': 'FAILED', 'error': str(error)}
+        elif pending_steps:
+            fields = {'status': 'INCOMPLETE', 'pending_steps': pending_steps}
+        else:
+            fields = {'status': 'SUCCEEDED'}
+        self.emit('run_end', client=client_name, connector=connector, total_ms=total_ms, **fields)
+
+    def bulk_finished(self, summary):
+        self.emit('bulk_end', summary=summary)
+
+    def render(self):
+        with self._lock:
+            events = list(self.events)
+        match self.log_format:
+            case 'sse':
+                return ''.join(
+                    f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+                    for index, event in enumerate(events)
+                )
+            case _:
+                return ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
@@ -0,0 +1,320 @@
+import os
+import time
+import socket
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout, Timeout
+
+
+logger = logging.getLogger()
+
+
+# Retry configuration
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "5"))
+
+# Retry budget shared by all the calls of the container, same scheme as botocore's standard retry quota
+RETRY_BUDGET_CAPACITY = int(os.environ.get("RETRY_BUDGET_CAPACITY", "500"))
+RETRY_COST = 5
+RETRY_TIMEOUT_COST = 10
+SUCCESS_REFILL = 1
+
+# Circuit breaker per host
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Adaptive rate limiter per host, enabled on the first throttled response
+RATE_LIMIT_MIN_RATE = 0.5
+RATE_LIMIT_MAX_RATE = 100.0
+RATE_LIMIT_BETA = 0.7
+RATE_LIMIT_INCREMENT = 0.5
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLING_STATUS_CODES = {429, 503}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryBudget:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.available = capacity
+        self._lock = threading.Lock()
+
+    def acquire(self, cost):
+        with self._lock:
+            if cost > self.available:
+                return False
+            self.available -= cost
+            return True
+
+    def release(self, amount):
+        with self._lock:
+            self.available = min(self.capacity, self.available + amount)
+
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail fast until the reset timeout has passed.
+    # half open: one trial call decides whether the circuit closes or opens again, the other
+    # calls fail fast while it is in flight
+    def __init__(self, host):
+        self.host = host
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            match self.state:
+                case 'open':
+                    if now - self.opened_at < CIRCUIT_RESET_TIMEOUT:
+                        return False
+                    self.state = 'half_open'
+                case 'half_open':
+                    # a probe that never reported back (e.g. cancelled) is given up after the reset timeout
+                    if self.probe_in_flight and now - self.probe_started_at < CIRCUIT_RESET_TIMEOUT:
+                        return False
+                case _:
+                    return True
+            self.probe_in_flight = True
+            self.probe_started_at = now
+            return True
+
+    def release_probe(self):
+        # the probe ended without telling whether the host recovered, the next call probes again
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= CIRCUIT_FAILURE_THRESHOLD:
+                if self.state != 'open':
+                    logger.warning(f"Opening circuit for host {self.host} after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveRateLimiter:
+    # token bucket similar in spirit to botocore's ClientRateLimiter: disabled until the host
+    # throttles, then the rate drops multiplicatively on throttling and grows back on success
+    def __init__(self, host):
+        self.host = host
+        self.enabled = False
+        self.rate = RATE_LIMIT_MAX_RATE
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def _measured_rate(self, now):
+        # calls sent in the last second, the older ones are dropped so the deque stays bounded
+        while self._sent and now - self._sent[0] > 1.0:
+            self._sent.popleft()
+        return float(len(self._sent))
+
+    def acquire_delay(self):
+        # reserve a token and return how long the caller has to wait before sending
+        with self._lock:
+            now = time.monotonic()
+            if not self.enabled:
+                # the sending rate is only measured until the first throttle, then the bucket sets it
+                self._sent.append(now)
+                self._measured_rate(now)
+                return 0.0
+
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1.0
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def on_throttle(self):
+        with self._lock:
+            current = self.rate if self.enabled else max(self._measured_rate(time.monotonic()), RATE_LIMIT_MIN_RATE)
+            self.rate = max(RATE_LIMIT_MIN_RATE, current * RATE_LIMIT_BETA)
+            if not self.enabled:
+                self.tokens = 0.0
+                self.last_refill = time.monotonic()
+                self._sent.clear()
+            self.enabled = True
+            logger.warning(f"Host {self.host} is throttling, sending rate lowered to {self.rate:.2f}/s")
+
+    def on_success(self):
+        with self._lock:
+            if self.enabled:
+                self.rate = min(RATE_LIMIT_MAX_RATE, self.rate + RATE_LIMIT_INCREMENT)
+                if self.rate >= RATE_LIMIT_MAX_RATE:
+                    self.enabled = False
+
+
+# state shared by all the invocations of the container
+_budget = RetryBudget(RETRY_BUDGET_CAPACITY)
+_breakers = {}
+_limiters = {}
+_state_lock = threading.Lock()
+
+
+def _host_state(host):
+    with _state_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+            _limiters[host] = AdaptiveRateLimiter(host)
+        return _breakers[host], _limiters[host]
+
+
+def _status_code(error):
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def classify(error, idempotent):
+    # returns (retryable, throttled, cost) of the failed attempt. non idempotent steps are only
+    # retried when the request was throttled or never reached the server
+    status_code = _status_code(error)
+    if status_code is not None:
+        throttled = status_code in THROTTLING_STATUS_CODES
+        retryable = throttled or (idempotent and status_code in RETRYABLE_STATUS_CODES)
+        return retryable, throttled, RETRY_COST
+
+    if isinstance(error, ConnectTimeout):
+        return True, False, RETRY_TIMEOUT_COST
+
+    if isinstance(error, (Timeout, asyncio.TimeoutError, TimeoutError)):
+        return idempotent, False, RETRY_TIMEOUT_COST
+
+    if isinstance(error, (RequestsConnectionError, ConnectionError, asyncio.IncompleteReadError, socket.gaierror)):
+        return idempotent, False, RETRY_COST
+
+    return False, False, 0
+
+
+def is_connection_failure(error):
+    status_code = _status_code(error)
+    return status_code is None or status_code >= 500
+
+
+def before_attempt(host):
+    breaker, limiter = _host_state(host)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit open for host {host}, failing fast")
+    return limiter.acquire_delay()
+
+
+def after_success(host):
+    breaker, limiter = _host_state(host)
+    breaker.record_success()
+    limiter.on_success()
+    _budget.release(SUCCESS_REFILL)
+
+
+def after_failure(host, error, attempt, idempotent):
+    # returns the delay before the next attempt or None when the error has to be raised
+    breaker, limiter = _host_state(host)
+    retryable, throttled, cost = classify(error, idempotent)
+
+    if throttled:
+        limiter.on_throttle()
+    if cost and is_connection_failure(error):
+        # only failures of the host itself count towards opening its circuit
+        breaker.record_failure()
+    else:
+        breaker.release_probe()
+
+    if not retryable or attempt >= RETRY_MAX_ATTEMPTS:
+        return None
+
+    if not _budget.acquire(cost):
+        logger.warning(f"Retry budget exhausted, not retrying call to {host}")
+        return None
+
+    # exponential backoff with full jitter, never shorter than the server's Retry-After
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+def _fits_deadline(deadline, delay):
+    # a retry is not worth waiting for when the invocation has to stop before it is sent
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is not None and delay >= remaining:
+        logger.warning(f"Not retrying, the backoff of {delay:.2f}s would run past the deadline")
+        return False
+    return True
+
+
+def call_with_retries(host, idempotent, attempt_call, deadline=None):
+    # returns the result of the first successful attempt and the number of attempts made
+    attempt = 0
+    while True:
+        attempt += 1
+        delay = before_attempt(host)
+        if delay:
+            time.sleep(delay)
+        try:
+            result = attempt_call()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            delay = after_failure(host, e, attempt, idempotent)
+            if delay is None or not _fits_deadline(deadline, delay):
+                raise
+            logger.warning(f"Attempt {attempt} to {host} failed: {e}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        after_success(host)
+        return result, attempt
+
+
+async def call_with_retries_async(host, idempotent, attempt_call, deadline=None):
+    attempt = 0
+    while True:
+        attempt += 1
+        delay = before_attempt(host)
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            result = await attempt_call()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            delay = after_failure(host, e, attempt, idempotent)
+            if delay is None or not _fits_deadline(deadline, delay):
+                raise
+            logger.warning(f"Attempt {attempt} to {host} failed: {e}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        after_success(host)
+        return result, attempt
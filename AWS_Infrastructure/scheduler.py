@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+logger = logging.getLogger()
+
+
+def build_step_graph(setupsteps, default_dependencies):
+    # map each step key to the set of step keys it has to wait for.
+    # a step may declare `depends_on` with step keys or step names, otherwise the
+    # default dependencies of its step name are used (ignoring steps not in the plan)
+    keys_by_name = {}
+    for step_key in sorted(setupsteps.keys()):
+        keys_by_name.setdefault(setupsteps[step_key].get('name'), []).append(step_key)
+
+    graph = {}
+    for step_key in sorted(setupsteps.keys()):
+        step = setupsteps[step_key]
+        declared = step.get('depends_on')
+        depends_on = declared if declared is not None else default_dependencies.get(step.get('name'), [])
+
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+
+        dependencies = set()
+        for dependency in depends_on:
+            if dependency in setupsteps:
+                dependencies.add(dependency)
+            elif dependency in keys_by_name:
+                dependencies.update(keys_by_name[dependency])
+            elif declared is not None:
+                raise ValueError(f"Unknown dependency '{dependency}' for step: {step_key}")
+
+        dependencies.discard(step_key)
+        graph[step_key] = dependencies
+
+    topological_levels(graph)
+    return graph
+
+
+def topological_levels(graph):
+    # group the steps in waves that can run together, raising on circular dependencies
+    remaining = {step_key: set(dependencies) for step_key, dependencies in graph.items()}
+    levels = []
+    while remaining:
+        ready = sorted(step_key for step_key, dependencies in remaining.items() if not dependencies)
+        if not ready:
+            raise ValueError(f"Circular dependency between steps: {', '.join(sorted(remaining))}")
+        levels.append(ready)
+        for step_key in ready:
+            del remaining[step_key]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+    return levels
+
+
+def run_step_graph(graph, run_step, max_workers):
+    # run every step as soon as all of its dependencies are done. on the first failure
+    # no new steps are started, the running ones are awaited and the error is re-raised
+    pending = {step_key: set(dependencies) for step_key, dependencies in graph.items()}
+    completed = set()
+    running = {}
+    results = {}
+    error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if error is None:
+                for step_key in sorted(pending.keys()):
+                    if pending[step_key] <= completed:
+                        del pending[step_key]
+                        running[executor.submit(run_step, step_key)] = step_key
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step_key = running.pop(future)
+                try:
+                    results[step_key] = future.result()
+                    completed.add(step_key)
+                except Exception as e:
+                    logger.error(f"Step {step_key} failed: {e}")
+                    if error is None:
+                        error = e
+
+    if error is not None:
+        raise error
+
+    return results
+
+
+async def run_step_graph_async(graph, run_step):
+    # same semantics as run_step_graph, with every step running as a task on the event loop.
+    # concurrency is bounded by the client the steps send their requests through
+    pending = {step_key: set(dependencies) for step_key, dependencies in graph.items()}
+    completed = set()
+    running = {}
+    results = {}
+    error = None
+
+    while pending or running:
+        if error is None:
+            for step_key in sorted(pending.keys()):
+                if pending[step_key] <= completed:
+                    del pending[step_key]
+                    running[asyncio.ensure_future(run_step(step_key))] = step_key
+
+        if not running:
+            break
+
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            step_key = running.pop(task)
+            try:
+                results[step_key] = task.result()
+                completed.add(step_key)
+            except Exception as e:
+                logger.error(f"Step {step_key} failed: {e}")
+                if error is None:
+                    error = e
+
+    if error is not None:
+        raise error
+
+    return results
@@ -0,0 +1,120 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+
+logger = logging.getLogger()
+
+
+# MongoDB clients of the stores, one per uri for the container
+_mongo_clients = {}
+_mongo_clients_lock = threading.Lock()
+
+
+def mongo_client(uri):
+    with _mongo_clients_lock:
+        client = _mongo_clients.get(uri)
+        if client is None:
+            # pymongo is only needed in the bundle when a mongo store is enabled
+            from pymongo import MongoClient
+            logger.info("Creating MongoDB client for the orchestrator stores")
+            # dates come back with their timezone, like the ones the file store reads
+            client = MongoClient(uri, tz_aware=True)
+            _mongo_clients[uri] = client
+    return client
+
+
+def _encode(value):
+    # dates are kept as {"$date": iso} like in extended json
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(document):
+    if len(document) == 1 and '$date' in document:
+        return datetime.fromisoformat(document['$date'])
+    return document
+
+
+class FileStore:
+    # one json file per key, the local stand-in of MongoStore for a single container
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace('/', '__') + '.json')
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f, object_hook=_decode)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, key, document):
+        # write to a temporary file first so a crash never leaves a truncated document
+        temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(document, f, default=_encode)
+        os.replace(temp_path, self._path(key))
+
+    def get(self, key):
+        with self._lock:
+            return self._read(key)
+
+    def put(self, key, document):
+        with self._lock:
+            self._write(key, document)
+
+    def update(self, key, fields):
+        # sets the given fields of the document, created when missing. dotted names set nested
+        # fields, the way $set does
+        with self._lock:
+            document = self._read(key) or {}
+            for name, value in fields.items():
+                *parents, field = name.split('.')
+                target = document
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[field] = value
+            self._write(key, document)
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+class MongoStore:
+    # one document per key, _id being the key
+    def __init__(self, uri, database, collection):
+        self.collection = mongo_client(uri)[database][collection]
+
+    def get(self, key):
+        return self.collection.find_one({'_id': key}, {'_id': 0})
+
+    def put(self, key, document):
+        self.collection.replace_one({'_id': key}, document, upsert=True)
+
+    def update(self, key, fields):
+        self.collection.update_one({'_id': key}, {'$set': fields}, upsert=True)
+
+    def delete(self, key):
+        self.collection.delete_one({'_id': key})
+
+
+def open_store(backend, directory, uri, database, collection):
+    # file, mongo or None for any other backend
+    match backend:
+        case 'mongo':
+            return MongoStore(uri, database, collection)
+        case 'file':
+            return FileStore(directory)
+    return None
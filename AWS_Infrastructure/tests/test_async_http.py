@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import socket
+import asyncio
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_http import AsyncHTTPClient, EmptyResponse  # noqa: E402
+
+
+def response(status, body=b'', headers=None):
+    head = f"HTTP/1.1 {status}\r\n" + ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    return head.encode('latin-1') + b'\r\n' + body
+
+
+def json_response(payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    return response('200 OK', body, {'Content-Type': 'application/json', 'Content-Length': len(body), **(headers or {})})
+
+
+class LocalServer:
+    # HTTP/1.1 server on a local port. handle(request) returns the raw response and whether the
+    # connection is closed after it, a None response closes the connection without answering
+    def __init__(self, handle):
+        self.handle = handle
+        self.port = None
+        self.connections = 0
+        self.requests = []
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        connection = self.connections
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                method, path, _ = request_line.split(' ')
+                headers = {
+                    name.strip().lower(): value.strip()
+                    for name, _, value in (line.partition(':') for line in header_lines if line)
+                }
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                request = {'connection': connection, 'method': method, 'path': path, 'headers': headers, 'body': body}
+                self.requests.append(request)
+
+                raw, close = self.handle(request)
+                if raw is None:
+                    break
+                writer.write(raw)
+                await writer.drain()
+                if close:
+                    break
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+class AsyncHTTPClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = AsyncHTTPClient(max_concurrency=4)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_content_length_body_keeps_the_connection(self):
+        async with LocalServer(lambda request: (json_response({'path': request['path']}), False)) as server:
+            first = await self.client.request('GET', f"{server.url}/first")
+            second = await self.client.request('POST', f"{server.url}/second", json_body={'a': 1})
+
+        self.assertEqual(first.json(), {'path': '/first'})
+        self.assertEqual(second.json(), {'path': '/second'})
+        self.assertFalse(first.reused_connection)
+        self.assertTrue(second.reused_connection)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(json.loads(server.requests[1]['body']), {'a': 1})
+
+    async def test_chunked_body(self):
+        chunked = b'4;name=value\r\nWiki\r\n6\r\npedia \r\nE\r\nin \r\n\r\nchunks.\r\n0\r\nExpires: never\r\n\r\n'
+
+        def handle(request):
+            return response('200 OK', chunked, {'Transfer-Encoding': 'chunked'}), False
+
+        async with LocalServer(handle) as server:
+            first = await self.client.request('GET', f"{server.url}/chunked")
+            # the trailers are consumed, the next response is read from the start of its status line
+            second = await self.client.request('GET', f"{server.url}/chunked")
+
+        self.assertEqual(first.content, b'Wikipedia in \r\n\r\nchunks.')
+        self.assertEqual(second.content, first.content)
+        self.assertTrue(second.reused_connection)
+        self.assertEqual(server.connections, 1)
+
+    async def test_connection_close_is_not_reused(self):
+        async with LocalServer(lambda request: (json_response({}, {'Connection': 'close'}), True)) as server:
+            first = await self.client.request('GET', f"{server.url}/")
+            second = await self.client.request('GET', f"{server.url}/")
+
+        self.assertFalse(first.reused_connection)
+        self.assertFalse(second.reused_connection)
+        self.assertEqual(server.connections, 2)
+
+    async def test_body_read_until_close_without_length(self):
+        async with LocalServer(lambda request: (response('200 OK', b'until eof'), True)) as server:
+            result = await self.client.request('GET', f"{server.url}/")
+            await self.client.request('GET', f"{server.url}/")
+
+        self.assertEqual(result.content, b'until eof')
+        self.assertEqual(server.connections, 2)
+
+    async def test_stale_idle_connection_is_replaced_before_sending(self):
+        # keep-alive response, then the server drops the connection while it is idle
+        async with LocalServer(lambda request: (json_response({}), True)) as server:
+            await self.client.request('GET', f"{server.url}/")
+            await asyncio.sleep(0.05)
+            result = await self.client.request('POST', f"{server.url}/", json_body={})
+
+        self.assertFalse(result.reused_connection)
+        self.assertEqual(server.connections, 2)
+        self.assertEqual([request['connection'] for request in server.requests], [1, 2])
+
+    async def test_post_failing_on_reused_connection_is_not_sent_again(self):
+        # the second request reaches the server, which closes the connection without answering
+        async with LocalServer(lambda request: (json_response({}) if request['path'] == '/first' else None, False)) as server:
+            await self.client.request('GET', f"{server.url}/first")
+            with self.assertRaises((ConnectionError, asyncio.IncompleteReadError, EmptyResponse)):
+                await self.client.request('POST', f"{server.url}/second", json_body={})
+
+        self.assertEqual([request['path'] for request in server.requests], ['/first', '/second'])
+
+    async def test_get_failing_on_reused_connection_is_sent_again(self):
+        def handle(request):
+            if request['path'] == '/second' and request['connection'] == 1:
+                return None, True
+            return json_response({'connection': request['connection']}), False
+
+        async with LocalServer(handle) as server:
+            await self.client.request('GET', f"{server.url}/first")
+            result = await self.client.request('GET', f"{server.url}/second")
+
+        self.assertEqual(result.json(), {'connection': 2})
+        self.assertFalse(result.reused_connection)
+        self.assertEqual([request['path'] for request in server.requests], ['/first', '/second', '/second'])
+
+    async def test_next_resolved_address_is_tried(self):
+        # nothing listens on the first address, the connection is made to the second one
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            closed_port = unused.getsockname()[1]
+
+        async with LocalServer(lambda request: (json_response({}), False)) as server:
+            addresses = [
+                (socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', closed_port)),
+                (socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', server.port))
+            ]
+            loop = asyncio.get_running_loop()
+            with mock.patch.object(loop, 'getaddrinfo', mock.AsyncMock(return_value=addresses)):
+                result = await self.client.request('GET', f"http://service.local:{server.port}/")
+
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.requests[0]['headers']['host'], f"service.local:{server.port}")
+
+    async def test_no_address_connects(self):
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            closed_port = unused.getsockname()[1]
+
+        with self.assertRaises(ConnectionRefusedError):
+            await self.client.request('GET', f"http://127.0.0.1:{closed_port}/")
+
+
+if __name__ == '__main__':
+    unittest.main()
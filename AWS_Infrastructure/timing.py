@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection as connection_util
+
+
+logger = logging.getLogger()
+
+
+# CloudWatch Embedded Metric Format configuration
+EMIT_METRICS = os.environ.get("EMIT_METRICS", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "AWSInfrastructure/Orchestrator")
+
+METRIC_NAMES = {
+    'wall': 'StepDuration',
+    'dns': 'StepDNSTime',
+    'connect': 'StepConnectTime',
+    'tls': 'StepTLSTime',
+    'ttfb': 'StepTimeToFirstByte',
+    'body': 'StepBodyReadTime'
+}
+
+
+def elapsed_ms(start, end=None):
+    return round(((end if end is not None else time.perf_counter()) - start) * 1000, 2)
+
+
+class _TimedConnectionMixin:
+    # records the duration of the connection phases of every request sent over the connection.
+    # dns/connect/tls are only non-zero for the request that opened the connection
+    _connect_timings = None
+    request_timings = None
+    # whether the last request was sent over a connection opened for an earlier one
+    reused_connection = None
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            # same address families as urllib3: IPv6 records only when the system supports IPv6
+            addresses = socket.getaddrinfo(
+                self._dns_host.strip('[]'), self.port, connection_util.allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+
+        # the resolved addresses are tried in order, connecting to them directly so the name is looked up only once
+        error = OSError(f"getaddrinfo returned no address for {self.host}")
+        for *_, address in addresses:
+            try:
+                sock = connection_util.create_connection(
+                    (address[0], self.port),
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options
+                )
+                break
+            except OSError as e:
+                error = e
+        else:
+            if isinstance(error, socket.timeout):
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+                ) from error
+            raise NewConnectionError(self, f"Failed to establish a new connection: {error}") from error
+
+        sys.audit("http.client.connect", self, self.host, self.port)
+        self._connect_timings = {'dns': elapsed_ms(start, resolved), 'connect': elapsed_ms(resolved)}
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timings = self._connect_timings or {'dns': 0.0, 'connect': 0.0}
+        timings['tls'] = 0.0
+        if isinstance(self, HTTPSConnection):
+            timings['tls'] = max(elapsed_ms(start) - timings['dns'] - timings['connect'], 0.0)
+        self._connect_timings = timings
+
+    def request(self, *args, **kwargs):
+        # https connections are opened before the request, http ones while it is sent
+        timings = self._connect_timings
+        self._connect_timings = None
+        self._request_start = time.perf_counter()
+        super().request(*args, **kwargs)
+        if self._connect_timings is not None:
+            timings = self._connect_timings
+            self._connect_timings = None
+            self._request_start += sum(timings.values()) / 1000
+        self.reused_connection = timings is None
+        self.request_timings = timings or {'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+
+    def getresponse(self):
+        response = super().getresponse()
+        self.request_timings['ttfb'] = elapsed_ms(self._request_start)
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+TIMED_POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+def emit_step_metrics(client_name, connector, step_key, timing):
+    # one Embedded Metric Format line per step, CloudWatch extracts the metrics from the log
+    if not EMIT_METRICS:
+        return
+
+    metrics = {METRIC_NAMES[name]: timing[name] for name in METRIC_NAMES if name in timing}
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Connector', 'Step']],
+                'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics]
+            }]
+        },
+        'Connector': connector,
+        'Step': timing.get('step'),
+        'Client': client_name,
+        'StepKey': step_key,
+        'Dispatch': timing.get('dispatch'),
+        'ReusedConnection': timing.get('reused_connection'),
+        **metrics
+    }
+    # printed rather than logged so the line is not prefixed by the log formatter
+    print(json.dumps(record), flush=True)
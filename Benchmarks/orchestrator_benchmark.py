@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the orchestrator keeps its journal and response cache per container, the benchmark
+# must execute every step so the cache is disabled and the journal kept out of the way
+os.environ.setdefault("IDEMPOTENCY_BACKEND", "none")
+os.environ.setdefault("JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "benchmark_journal"))
+os.environ.setdefault("EMIT_METRICS", "false")
+sys.path.insert(0, os.path.join(ROOT_DIR, "AWS_Infrastructure"))
+
+import lambda_function  # noqa: E402
+import retries  # noqa: E402
+
+# the step logs of thousands of calls would bury the report
+logging.getLogger().setLevel(logging.ERROR)
+
+
+class LatencyModel:
+    # latency and error distribution of one stand-in endpoint
+    def __init__(self, distribution, mean_ms, jitter_ms, error_rate, error_statuses):
+        self.distribution = distribution
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+
+    def latency(self):
+        match self.distribution:
+            case 'fixed':
+                value = self.mean_ms
+            case 'uniform':
+                value = random.uniform(self.mean_ms - self.jitter_ms, self.mean_ms + self.jitter_ms)
+            case 'exponential':
+                value = random.expovariate(1 / self.mean_ms) if self.mean_ms else 0
+            case 'lognormal':
+                # jitter is the standard deviation of the distribution, mean stays mean_ms
+                sigma = math.sqrt(math.log(1 + (self.jitter_ms / self.mean_ms) ** 2)) if self.mean_ms else 0
+                value = random.lognormvariate(math.log(self.mean_ms or 1) - sigma ** 2 / 2, sigma)
+        return max(value, 0) / 1000
+
+    def status(self):
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_statuses)
+        return 200
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    model = None
+    step_name = None
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        time.sleep(self.model.latency())
+        status = self.model.status()
+        body = json.dumps({'message': f"{self.step_name} stand-in", 'status': status}).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+def start_stand_ins(models):
+    # one local server per step, the urls of STEP_URL_CONFIG are pointed at them
+    servers = []
+    for step_name, config in lambda_function.STEP_URL_CONFIG.items():
+        handler = type(f"{step_name}_handler", (StandInHandler,), {'model': models[step_name], 'step_name': step_name})
+        server = StandInServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        url = urlsplit(config['url'])
+        config['url'] = f"http://127.0.0.1:{server.server_address[1]}{url.path}"
+    return servers
+
+
+def reset_retry_state():
+    # every scenario starts with closed circuits and a full retry budget
+    with retries._state_lock:
+        retries._breakers.clear()
+        retries._limiters.clear()
+    retries._budget.available = retries._budget.capacity
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def parse_events(body):
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+def run_invocation(body, client_name, connector):
+    event = {
+        'pathParameters': {'client': client_name, 'connector': connector},
+        'body': json.dumps(body)
+    }
+    response = lambda_function.lambda_handler(event, None)
+    if response['headers'].get('Content-Type') != 'application/x-ndjson':
+        return [{'event': 'run_end', 'client': client_name, 'connector': connector, 'status': 'FAILED',
+                 'total_ms': 0, 'error': response['body']}]
+    return parse_events(response['body'])
+
+
+def run_scenario(clients, setupsteps, connector, args):
+    body = {
+        'setupsteps': setupsteps,
+        'execution_mode': args.execution_mode,
+        'resume': False,
+        'event_log': 'ndjson'
+    }
+
+    reset_retry_state()
+    start = time.perf_counter()
+    match args.scenario:
+        case 'concurrent':
+            # one invocation per client, all in flight at the same time
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                runs = list(executor.map(
+                    lambda index: run_invocation(body, f"bench_client_{index}", connector),
+                    range(clients)
+                ))
+            events = [event for run in runs for event in run]
+        case 'bulk':
+            # one invocation provisioning every client
+            bulk_body = dict(body, clients=[
+                {'client': f"bench_client_{index}", 'connector': connector} for index in range(clients)
+            ])
+            events = run_invocation(bulk_body, None, None)
+    wall_s = time.perf_counter() - start
+
+    step_names = {step_key: step['name'] for step_key, step in setupsteps.items()}
+    step_latencies = {}
+    attempts = 0
+    for event in events:
+        if event['event'] == 'step_end' and event['status'] == 'SUCCEEDED':
+            step_latencies.setdefault(step_names[event['step']], []).append(event['wall_ms'])
+            attempts += event['attempts']
+
+    runs = [event for event in events if event['event'] == 'run_end']
+    succeeded = [run for run in runs if run['status'] == 'SUCCEEDED']
+    steps = sum(len(values) for values in step_latencies.values())
+    return {
+        'clients': clients,
+        'succeeded': len(succeeded),
+        'failed': clients - len(succeeded),
+        'wall_s': round(wall_s, 3),
+        'clients_per_s': round(len(succeeded) / wall_s, 2),
+        'steps_per_s': round(steps / wall_s, 2),
+        'attempts_per_step': round(attempts / steps, 3) if steps else 0,
+        'provisioning_ms': {
+            'p50': percentile([run['total_ms'] for run in succeeded], 50),
+            'p95': percentile([run['total_ms'] for run in succeeded], 95),
+            'max': percentile([run['total_ms'] for run in succeeded], 100)
+        },
+        'steps': {
+            name: {
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'p99': percentile(values, 99)
+            }
+            for name, values in sorted(step_latencies.items())
+        },
+        'errors': sorted({run.get('error') for run in runs if run['status'] == 'FAILED'})[:5]
+    }
+
+
+def print_report(result):
+    print(f"\n== {result['clients']} clients: {result['succeeded']} succeeded, {result['failed']} failed in {result['wall_s']}s")
+    print(f"   throughput: {result['clients_per_s']} clients/s, {result['steps_per_s']} steps/s, "
+          f"{result['attempts_per_step']} attempts per step")
+    provisioning = result['provisioning_ms']
+    print(f"   provisioning time (ms): p50 {provisioning['p50']}  p95 {provisioning['p95']}  max {provisioning['max']}")
+    print(f"   {'step':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in result['steps'].items():
+        print(f"   {name:<28}{stats['count']:>7}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}")
+    for error in result['errors']:
+        print(f"   error: {error}")
+
+
+def parse_step_overrides(values):
+    # name=ms pairs overriding the mean latency of single steps
+    overrides = {}
+    for value in values or []:
+        name, _, latency = value.partition('=')
+        if name not in lambda_function.STEP_URL_CONFIG:
+            raise SystemExit(f"Unknown step: {name}")
+        overrides[name] = float(latency)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AWS_Infrastructure against local step stand-ins")
+    parser.add_argument('--clients', default='1,10,100', help="comma separated numbers of concurrent clients")
+    parser.add_argument('--scenario', choices=('concurrent', 'bulk'), default='concurrent',
+                        help="one invocation per client or a single bulk invocation")
+    parser.add_argument('--execution-mode', choices=lambda_function.EXECUTION_MODES, default='parallel')
+    parser.add_argument('--payload', default=os.path.join(ROOT_DIR, 'Working_JSONs', 'walmart_working.json'))
+    parser.add_argument('--distribution', choices=('fixed', 'uniform', 'exponential', 'lognormal'), default='lognormal')
+    parser.add_argument('--latency-ms', type=float, default=100, help="mean latency of every stand-in")
+    parser.add_argument('--jitter-ms', type=float, default=30, help="spread of the latency (uniform, lognormal)")
+    parser.add_argument('--step-latency', action='append', metavar='STEP=MS', help="mean latency of one step")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of the calls answered with an error")
+    parser.add_argument('--error-status', default='503', help="comma separated error status codes")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    step_latency = parse_step_overrides(args.step_latency)
+    error_statuses = [int(status) for status in args.error_status.split(',')]
+    models = {
+        name: LatencyModel(args.distribution, step_latency.get(name, args.latency_ms), args.jitter_ms,
+                           args.error_rate, error_statuses)
+        for name in lambda_function.STEP_URL_CONFIG
+    }
+    servers = start_stand_ins(models)
+
+    with open(args.payload, 'r') as f:
+        payload = json.load(f)
+    setupsteps = payload['body']['setupsteps']
+    connector = payload['pathParameters']['connector']
+
+    results = []
+    try:
+        for clients in [int(value) for value in args.clients.split(',')]:
+            # the progress events are also printed by the orchestrator, they are read from the responses
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                result = run_scenario(clients, setupsteps, connector, args)
+            results.append(result)
+            if not args.json:
+                print_report(result)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import mmap
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_DIR = os.path.join(ROOT_DIR, "Create_Connector_Collection_Mongo")
+sys.path.insert(0, SEED_DIR)
+
+import seed  # noqa: E402
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def write_artifact(template_path, directory, artifact_format, args):
+    # the template in one of the formats a bundle can ship, returns the path to seed from
+    name = os.path.basename(template_path)
+    match artifact_format:
+        case 'json':
+            path = os.path.join(directory, name)
+            shutil.copy2(template_path, path)
+        case 'gzip':
+            path = os.path.join(directory, name + '.gz')
+            with open(template_path, 'rb') as source, gzip.open(path, 'wb', compresslevel=args.gzip_level) as out:
+                shutil.copyfileobj(source, out)
+        case 'zstd':
+            path = os.path.join(directory, name + '.zst')
+            with open(template_path, 'rb') as source, open(path, 'wb') as out:
+                zstandard.ZstdCompressor(level=args.zstd_level).copy_stream(source, out)
+        case 'snapshot':
+            path = os.path.join(directory, name)
+            shutil.copy2(template_path, path)
+            seed.write_snapshot(path)
+            os.remove(path)
+    return path
+
+
+def artifact_files(path, artifact_format):
+    if artifact_format == 'snapshot':
+        return list(seed.snapshot_paths(path))
+    return [path]
+
+
+def parse_documents(path, artifact_format):
+    # everything seed_collection does before the inserts, returns the number of documents
+    if artifact_format == 'snapshot':
+        index = seed.load_snapshot_index(path, 'auto')
+        with open(seed.snapshot_paths(path)[0], 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return sum(len(batch) for batch in seed.iter_snapshot_batches(mapped, index))
+    with seed.open_template(path) as f:
+        stream = seed.JsonStream(f)
+        _, documents = seed.iter_seed_documents(stream, 'auto')
+        count = sum(1 for _ in documents)
+        stream.end()
+    return count
+
+
+def timed(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, round(statistics.median(times), 2)
+
+
+def benchmark_format(template_path, artifact_format, work_dir, args):
+    artifact_dir = os.path.join(work_dir, artifact_format)
+    os.makedirs(artifact_dir, exist_ok=True)
+    path = write_artifact(template_path, artifact_dir, artifact_format, args)
+    files = artifact_files(path, artifact_format)
+
+    # deployment zip of the artifact alone, deflated like the zips uploaded to Lambda
+    zip_path = os.path.join(work_dir, f"{artifact_format}.zip")
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for file_path in files:
+            bundle.write(file_path, os.path.basename(file_path))
+
+    # cold start: Lambda extracts the zip to /var/task before the handler is imported
+    extract_dir = os.path.join(work_dir, f"{artifact_format}_extracted")
+
+    def extract():
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        with zipfile.ZipFile(zip_path) as bundle:
+            bundle.extractall(extract_dir)
+
+    _, extract_ms = timed(extract, args.runs)
+    extracted_path = os.path.join(extract_dir, os.path.basename(path))
+    documents, parse_ms = timed(lambda: parse_documents(extracted_path, artifact_format), args.runs)
+
+    tracemalloc.start()
+    parse_documents(extracted_path, artifact_format)
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+
+    return {
+        'template': os.path.basename(template_path),
+        'format': artifact_format,
+        'documents': documents,
+        'artifact_kb': round(sum(os.path.getsize(file_path) for file_path in files) / 1024, 1),
+        'zip_kb': round(os.path.getsize(zip_path) / 1024, 1),
+        'extract_ms': extract_ms,
+        'parse_ms': parse_ms,
+        'parse_peak_mb': round(peak_mb, 2)
+    }
+
+
+def print_report(results):
+    print(f"{'template':<22}{'format':<10}{'documents':>10}{'file KB':>10}{'zip KB':>9}"
+          f"{'extract ms':>12}{'parse ms':>10}{'peak MB':>9}")
+    for result in results:
+        print(f"{result['template']:<22}{result['format']:<10}{result['documents']:>10}{result['artifact_kb']:>10}"
+              f"{result['zip_kb']:>9}{result['extract_ms']:>12}{result['parse_ms']:>10}{result['parse_peak_mb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the seed template formats: size, extraction and parse time")
+    parser.add_argument('templates', nargs='*', help="json templates, the ones of Create_Connector_Collection_Mongo by default")
+    parser.add_argument('--formats', default='json,gzip,zstd,snapshot', help="comma separated formats to compare")
+    parser.add_argument('--gzip-level', type=int, default=9)
+    parser.add_argument('--zstd-level', type=int, default=19)
+    parser.add_argument('--runs', type=int, default=5, help="runs per measure, the median is reported")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    formats = [artifact_format for artifact_format in args.formats.split(',') if artifact_format]
+    if 'zstd' in formats and zstandard is None:
+        print("zstandard is not installed, skipping the zstd format", file=sys.stderr)
+        formats.remove('zstd')
+    templates = args.templates or sorted(glob.glob(os.path.join(SEED_DIR, '*.json')))
+
+    results = []
+    for template_path in templates:
+        for artifact_format in formats:
+            with tempfile.TemporaryDirectory() as work_dir:
+                results.append(benchmark_format(template_path, artifact_format, work_dir, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
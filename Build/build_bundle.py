@@ -0,0 +1,435 @@
+import os
+import re
+import sys
+import gzip
+import json
+import glob
+import shutil
+import zipfile
+import argparse
+import statistics
+import tempfile
+import subprocess
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# dependencies shared by the functions, deployed once as a Lambda layer
+LAYER_NAME = 'Shared_Layer'
+LAYER_DIR = os.path.join(ROOT_DIR, LAYER_NAME)
+
+# Lambda runtime the bundles are built for
+PYTHON_VERSION = "3.10"
+PLATFORM = "manylinux2014_x86_64"
+
+# C extensions that have to be present for the runtime, by package
+NATIVE_EXTENSIONS = {
+    'bson': ['_cbson'],
+    'pymongo': ['_cmessage']
+}
+# packages whose wheels ship the extensions above
+NATIVE_DISTRIBUTIONS = ['pymongo']
+
+# modules of the shared layer imported by the function code, copied into the bundles built without the layer
+SHARED_MODULES = ['mongo_common', 'botocore_model_cache']
+
+# boto3 clients created by the function code, the botocore models of the other services are pruned
+CLIENT_PATTERN = re.compile(r'''boto3\.client\(\s*['"]([a-z0-9\-]+)['"]''')
+
+
+def lambda_functions():
+    return sorted(
+        name for name in os.listdir(ROOT_DIR)
+        if os.path.isfile(os.path.join(ROOT_DIR, name, 'lambda_function.py'))
+    )
+
+
+def extension_suffix(python_version):
+    return f".cpython-{python_version.replace('.', '')}-x86_64-linux-gnu.so"
+
+
+def pip(*args):
+    command = [sys.executable, '-m', 'pip', *args]
+    print(' '.join(command))
+    subprocess.run(command, check=True)
+
+
+def platform_args(args):
+    return [
+        '--platform', args.platform,
+        '--python-version', args.python_version,
+        '--implementation', 'cp',
+        '--only-binary=:all:'
+    ]
+
+
+def read_requirements(directory):
+    # {normalized distribution name: requirement line} of the requirements.txt of a directory
+    requirements = {}
+    requirements_path = os.path.join(directory, 'requirements.txt')
+    if not os.path.isfile(requirements_path):
+        return requirements
+    with open(requirements_path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            match = re.match(r'^([A-Za-z0-9_.\-]+)', line)
+            if match:
+                requirements[re.sub(r'[-_.]+', '-', match.group(1)).lower()] = line
+    return requirements
+
+
+def pinned_version(function_dir, distribution):
+    requirement = read_requirements(function_dir).get(distribution.lower(), '')
+    match = re.match(r'^[^=]+==\s*([^\s;]+)', requirement)
+    return match.group(1) if match else None
+
+
+def check_native_extensions(directory, python_version):
+    # returns the missing extension modules, the pure Python fallback of bson is several times slower
+    missing = []
+    suffix = extension_suffix(python_version)
+    for package, modules in NATIVE_EXTENSIONS.items():
+        if not os.path.isdir(os.path.join(directory, package)):
+            continue
+        for module in modules:
+            if not os.path.isfile(os.path.join(directory, package, module + suffix)):
+                missing.append(f"{package}/{module}{suffix}")
+    return missing
+
+
+def install_native_extensions(function_name, args):
+    # add the manylinux builds of the C extensions next to the vendored packages of the function
+    function_dir = os.path.join(ROOT_DIR, function_name)
+    suffix = extension_suffix(args.python_version)
+    for distribution in NATIVE_DISTRIBUTIONS:
+        version = pinned_version(function_dir, distribution)
+        if version is None:
+            continue
+
+        with tempfile.TemporaryDirectory() as download_dir:
+            pip('download', f"{distribution}=={version}", '--no-deps', '--dest', download_dir, *platform_args(args))
+            for wheel_path in glob.glob(os.path.join(download_dir, '*.whl')):
+                with zipfile.ZipFile(wheel_path) as wheel:
+                    for member in wheel.namelist():
+                        if member.endswith(suffix):
+                            wheel.extract(member, function_dir)
+                            print(f"{function_name}: {member}")
+
+
+def referenced_services(function_names):
+    services = set()
+    for function_name in function_names:
+        function_dir = os.path.join(ROOT_DIR, function_name)
+        for path in glob.glob(os.path.join(function_dir, '*.py')):
+            with open(path, 'r', encoding='utf-8') as f:
+                services.update(CLIENT_PATTERN.findall(f.read()))
+    return services
+
+
+def imported_shared_modules(function_name):
+    modules = set()
+    for path in glob.glob(os.path.join(ROOT_DIR, function_name, '*.py')):
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        modules.update(name for name in SHARED_MODULES if re.search(rf'^\s*(from|import)\s+{name}\b', source, re.M))
+    return modules
+
+
+def copy_shared_modules(directory, modules):
+    for name in sorted(modules):
+        shutil.copy2(os.path.join(LAYER_DIR, name + '.py'), directory)
+
+
+def prune_botocore_data(directory, services):
+    # keep the top level files (endpoints, partitions, retry and default configuration) and the
+    # service directories of the clients in use, with their endpoint rule sets
+    data_dir = os.path.join(directory, 'botocore', 'data')
+    before = directory_size(data_dir)
+    for name in os.listdir(data_dir):
+        path = os.path.join(data_dir, name)
+        if os.path.isdir(path) and name not in services:
+            shutil.rmtree(path)
+    verify_botocore_services(directory, services)
+    print(f"botocore/data pruned to {', '.join(sorted(services)) or 'no service'}: "
+          f"{before / 1024 / 1024:.1f} MB -> {directory_size(data_dir) / 1024 / 1024:.1f} MB")
+
+
+def verify_botocore_services(directory, services):
+    # the pruned data has to resolve every kept service, loaded the way a client creation does
+    code = (
+        "import sys, json; from botocore.loaders import Loader; loader = Loader(); "
+        "services = json.loads(sys.argv[1]); available = set(loader.list_available_services('service-2')); "
+        "missing = [name for name in services if name not in available]; "
+        "[loader.load_data(name) for name in ('endpoints', 'partitions', '_retry', 'sdk-default-configuration')]; "
+        "[(loader.load_service_model(name, 'service-2'), loader.load_service_model(name, 'endpoint-rule-set-1')) "
+        "for name in services if name in available]; print(json.dumps(missing))"
+    )
+    env = dict(os.environ, PYTHONPATH=directory, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-c', code, json.dumps(sorted(services))], env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"{directory}: botocore data check failed\n{result.stderr}")
+    missing = json.loads(result.stdout.strip().splitlines()[-1])
+    if missing:
+        raise SystemExit(f"{directory}: botocore data missing for {missing}")
+
+
+def write_model_cache(directory, services):
+    # pickled service models next to the installed botocore, loaded by botocore_model_cache.install()
+    # in the handlers instead of decompressing and parsing the json models at every cold start
+    shutil.copy2(os.path.join(LAYER_DIR, 'botocore_model_cache.py'), directory)
+    env = dict(os.environ, PYTHONPATH=directory, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, 'botocore_model_cache.py', *sorted(services)], cwd=directory, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"{directory}: botocore model cache failed\n{result.stderr}")
+    print(result.stdout.strip())
+
+
+def prepare_botocore(directory, services, args):
+    if not os.path.isdir(os.path.join(directory, 'botocore')):
+        return
+    if args.prune:
+        prune_botocore_data(directory, services)
+    if args.model_cache:
+        write_model_cache(directory, services)
+
+
+def compress_template(path, compression):
+    # the seed loader decompresses gzip and zstd templates while it reads them. the gzip header
+    # gets no mtime so the same template always gives the same bytes
+    match compression:
+        case 'gzip':
+            compressed_path = path + '.gz'
+            with open(path, 'rb') as source, open(compressed_path, 'wb') as f, \
+                    gzip.GzipFile(filename='', mode='wb', fileobj=f, compresslevel=9, mtime=0) as out:
+                shutil.copyfileobj(source, out)
+        case 'zstd':
+            import zstandard
+            compressed_path = path + '.zst'
+            with open(path, 'rb') as source, open(compressed_path, 'wb') as out:
+                zstandard.ZstdCompressor(level=19).copy_stream(source, out)
+    os.remove(path)
+    return compressed_path
+
+
+def write_seed_snapshots(stage_dir, args):
+    # pre-encoded BSON snapshots of the seed templates of the functions that load them (seed.py),
+    # made after the compression so they are checked against the file shipped in the bundle
+    if not os.path.isfile(os.path.join(stage_dir, 'seed.py')):
+        return
+    templates = sorted(glob.glob(os.path.join(stage_dir, '*.json')))
+    if args.seed_compression != 'none':
+        templates = [compress_template(path, args.seed_compression) for path in templates]
+    templates = [os.path.basename(path) for path in templates]
+    if not templates:
+        return
+    python_path = [stage_dir]
+    if args.layer:
+        python_path.append(os.path.join(args.output, LAYER_NAME, 'python'))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path), PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, 'seed.py', *templates], cwd=stage_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"{stage_dir}: seed snapshots failed (with --layer build the layer first)\n{result.stderr}")
+    print(result.stdout.strip())
+
+
+def install_requirements(requirements, target, args):
+    if requirements:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('\n'.join(requirements) + '\n')
+        try:
+            pip('install', '--no-cache-dir', '--target', target, '-r', f.name, *platform_args(args))
+        finally:
+            os.remove(f.name)
+
+
+def function_files(function_dir, installed):
+    # the files of the function itself, everything pip installs and the tests are left out
+    for name in sorted(os.listdir(function_dir)):
+        if name in installed or name.endswith('.dist-info') or name in ('__pycache__', 'requirements.txt', 'tests'):
+            continue
+        yield name
+
+
+def build_layer(args):
+    # the layer packages go under python/, which Lambda adds to sys.path from /opt/python
+    stage_dir = os.path.join(args.output, LAYER_NAME)
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    python_dir = os.path.join(stage_dir, 'python')
+    os.makedirs(python_dir)
+
+    install_requirements(list(read_requirements(LAYER_DIR).values()), python_dir, args)
+    copy_shared_modules(python_dir, SHARED_MODULES)
+    prepare_botocore(python_dir, args.services or referenced_services(lambda_functions()), args)
+
+    missing = check_native_extensions(python_dir, args.python_version)
+    if missing:
+        raise SystemExit(f"{LAYER_NAME}: missing C extensions {missing}")
+
+    zip_path = shutil.make_archive(stage_dir, 'zip', stage_dir)
+    print(f"{LAYER_NAME}: {zip_path} ({os.path.getsize(zip_path) / 1024 / 1024:.1f} MB)")
+
+
+def build_bundle(function_name, args):
+    # clean install of the pinned requirements for the Lambda platform, then the function files on top.
+    # with --layer the requirements provided by the shared layer are left out of the bundle
+    function_dir = os.path.join(ROOT_DIR, function_name)
+    stage_dir = os.path.join(args.output, function_name)
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    os.makedirs(stage_dir)
+
+    requirements = read_requirements(function_dir)
+    if args.layer:
+        layer_requirements = read_requirements(LAYER_DIR)
+        for name in requirements.keys() & layer_requirements.keys():
+            if requirements[name] != layer_requirements[name]:
+                raise SystemExit(f"{function_name}: {requirements[name]} does not match {layer_requirements[name]} of the layer")
+            del requirements[name]
+    install_requirements(list(requirements.values()), stage_dir, args)
+    prepare_botocore(stage_dir, args.services or referenced_services([function_name]), args)
+    if not args.layer:
+        copy_shared_modules(stage_dir, imported_shared_modules(function_name))
+
+    installed = set(os.listdir(stage_dir))
+    # top level names of the packages vendored in the function directory
+    for record_path in glob.glob(os.path.join(function_dir, '*.dist-info', 'RECORD')):
+        with open(record_path, 'r') as f:
+            installed.update(line.split('/', 1)[0].split(',', 1)[0] for line in f if line.strip())
+
+    for name in function_files(function_dir, installed):
+        source = os.path.join(function_dir, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(stage_dir, name), ignore=shutil.ignore_patterns('__pycache__'))
+        else:
+            shutil.copy2(source, os.path.join(stage_dir, name))
+    write_seed_snapshots(stage_dir, args)
+
+    missing = check_native_extensions(stage_dir, args.python_version)
+    if missing:
+        raise SystemExit(f"{function_name}: missing C extensions {missing}")
+
+    zip_path = shutil.make_archive(stage_dir, 'zip', stage_dir)
+    print(f"{function_name}: {zip_path} ({os.path.getsize(zip_path) / 1024 / 1024:.1f} MB)")
+    return zip_path
+
+
+def directory_size(directory):
+    size = 0
+    for path, dir_names, file_names in os.walk(directory):
+        dir_names[:] = [name for name in dir_names if name != '__pycache__']
+        size += sum(os.path.getsize(os.path.join(path, name)) for name in file_names)
+    return size
+
+
+def import_time_ms(directory, python_path, runs):
+    # median time of a fresh interpreter importing the handler module, the way a cold start does.
+    # measured with the interpreter running the script, the handlers create their boto3 clients
+    # at import so a region is needed even though nothing is sent to AWS
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path), PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    code = (
+        "import time; start = time.perf_counter(); import lambda_function; "
+        "print((time.perf_counter() - start) * 1000)"
+    )
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], cwd=directory, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def report(functions, args):
+    # size and import time of every function with its vendored packages and with the shared layer
+    args.layer = True
+    layer_python_dir = os.path.join(args.output, LAYER_NAME, 'python')
+    if not os.path.isdir(layer_python_dir):
+        build_layer(args)
+    layer_size = directory_size(layer_python_dir)
+    print(f"\n{LAYER_NAME}: {layer_size / 1024 / 1024:.1f} MB unzipped, "
+          f"{os.path.getsize(os.path.join(args.output, LAYER_NAME + '.zip')) / 1024 / 1024:.1f} MB zipped")
+
+    rows = []
+    for function_name in functions:
+        zip_path = build_bundle(function_name, args)
+        function_dir = os.path.join(ROOT_DIR, function_name)
+        stage_dir = os.path.join(args.output, function_name)
+        rows.append((
+            function_name,
+            directory_size(function_dir) / 1024 / 1024,
+            directory_size(stage_dir) / 1024 / 1024,
+            os.path.getsize(zip_path) / 1024 / 1024,
+            # the shared modules are next to their source in the repository
+            import_time_ms(function_dir, [LAYER_DIR], args.runs),
+            import_time_ms(stage_dir, [layer_python_dir], args.runs)
+        ))
+
+    def milliseconds(value):
+        return 'failed' if value is None else f"{value:.0f}"
+
+    print(f"\n{'function':<36}{'vendored MB':>12}{'bundle MB':>11}{'zip MB':>9}{'import ms':>11}{'with layer':>12}")
+    for name, vendored, bundle, zipped, vendored_ms, layer_ms in rows:
+        print(f"{name:<36}{vendored:>12.1f}{bundle:>11.2f}{zipped:>9.2f}{milliseconds(vendored_ms):>11}{milliseconds(layer_ms):>12}")
+    print(f"vendored total: {sum(row[1] for row in rows):.1f} MB, "
+          f"bundles and layer total: {sum(row[2] for row in rows) + layer_size / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Lambda deployment bundles with Linux C extensions")
+    parser.add_argument('command', choices=('bundle', 'layer', 'report', 'native', 'check'), help=(
+        "bundle: build the zip of each function from a clean install for the Lambda platform. "
+        "layer: build the zip of the shared dependency layer. "
+        "report: size and import time of each function with its vendored packages and with the layer. "
+        "native: add the manylinux C extensions to the vendored packages of each function directory. "
+        "check: list the function directories missing the C extensions"
+    ))
+    parser.add_argument('functions', nargs='*', help="function directories, all of them by default")
+    parser.add_argument('--python-version', default=PYTHON_VERSION)
+    parser.add_argument('--platform', default=PLATFORM)
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'Build', 'dist'))
+    parser.add_argument('--layer', action='store_true', help="leave the packages of the shared layer out of the bundles")
+    parser.add_argument('--runs', type=int, default=5, help="imports measured per function by report")
+    parser.add_argument('--services', type=lambda value: set(filter(None, value.split(','))), default=None,
+                        help="botocore service models to keep, by default the boto3 clients created by the functions")
+    parser.add_argument('--no-prune', dest='prune', action='store_false', help="keep every botocore service model")
+    parser.add_argument('--no-model-cache', dest='model_cache', action='store_false',
+                        help="leave out the pickled botocore service models")
+    parser.add_argument('--seed-compression', choices=('none', 'gzip', 'zstd'), default='gzip',
+                        help="compression of the seed templates shipped in the bundles (zstd needs zstandard)")
+    args = parser.parse_args()
+
+    functions = args.functions or lambda_functions()
+    match args.command:
+        case 'layer':
+            build_layer(args)
+            return
+        case 'report':
+            report(functions, args)
+            return
+
+    missing_any = False
+    for function_name in functions:
+        match args.command:
+            case 'bundle':
+                build_bundle(function_name, args)
+            case 'native':
+                install_native_extensions(function_name, args)
+            case 'check':
+                missing = check_native_extensions(os.path.join(ROOT_DIR, function_name), args.python_version)
+                if missing:
+                    missing_any = True
+                    print(f"{function_name}: missing {', '.join(missing)}")
+                else:
+                    print(f"{function_name}: ok")
+
+    if missing_any:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
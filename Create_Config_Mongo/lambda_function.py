@@ -1,18 +1,12 @@
 import json
-import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 import logging
+from mongo_common import mongo_connection, ConnectionFailure
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-# MongoDB connection
-MONGODB_URI = os.environ.get('MONGODB_URI')
-
-
 # CORS header
 cors_headers = {
     'Access-Control-Allow-Origin': '*',
@@ -41,8 +35,7 @@ def lambda_handler(event, context):
         logger.info(f"Processing request of client: {dbName} for connector: {connector}")
 
         # connect to MongoDB
-        with MongoClient(MONGODB_URI) as client:
-            client.admin.command('ping')
+        with mongo_connection() as client:
             
             # fetch template
             logger.info(f"Fetching template configuration for connector: {connector}")
@@ -74,10 +67,12 @@ def lambda_handler(event, context):
             existing_databases = client.list_database_names()
             db_exists = dbName in existing_databases
 
+            # CONFIG_VERSION changes on every write, the handlers caching the document revalidate with it
             if db_exists:
-                config_collection.update_one({}, {'$set': config_doc}, upsert=True)
+                config_collection.update_one({}, {'$set': config_doc, '$inc': {'CONFIG_VERSION': 1}}, upsert=True)
                 message = 'Configuration document updated successfully'
             else:
+                config_doc['CONFIG_VERSION'] = 1
                 config_collection.insert_one(config_doc)
                 message = 'Configuration document inserted successfully'
 
@@ -1,14 +1,20 @@
 import json
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from bson import ObjectId
 import logging
+from mongo_common import mongo_connection, ConnectionFailure
+# top level module in its own bundle, package submodule when the orchestrator imports it in process
+try:
+    from .seed import template_spec, seed_template
+except ImportError:
+    from seed import template_spec, seed_template
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-MONGODB_URI = os.environ.get('MONGODB_URI')
+
+# template files ship next to this module, which is not the working directory when the orchestrator
+# imports it in process
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 cors_headers = {
     'Access-Control-Allow-Origin': '*',
@@ -16,6 +22,7 @@ cors_headers = {
     'Access-Control-Allow-Methods': 'OPTIONS,GET,POST'
 }
 
+
 def lambda_handler(event, context):
     try:
         path_params = event.get("pathParameters", {})
@@ -49,8 +56,7 @@ def lambda_handler(event, context):
             }
 
         # Use 'with' for MongoDB client connection
-        with MongoClient(MONGODB_URI) as client:
-            client.admin.command('ping')
+        with mongo_connection() as client:
             db = client[client_name]
             logger.info("Connected to MongoDB")
 
@@ -65,6 +71,7 @@ def lambda_handler(event, context):
                 }
 
             created_collections = []
+            seeded = {}
 
             for key in requested_keys:
                 collection_name = config_doc.get(key)
@@ -73,23 +80,23 @@ def lambda_handler(event, context):
                     continue
 
                 collection = db[collection_name]
-                template_file = template_files.get(key)
+                template = template_files.get(key)
+
+                if template:
+                    try:
+                        template_file, mode, force = template_spec(template)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': cors_headers,
+                            'body': json.dumps({'error': str(e)})
+                        }
 
-                if template_file:
                     try:
-                        with open(template_file, 'r') as f:
-                            data = json.load(f)
-
-                        if isinstance(data, list):
-                            for doc in data:
-                                if '_id' in doc and isinstance(doc['_id'], dict) and '$oid' in doc['_id']:
-                                    doc['_id'] = ObjectId(doc['_id']['$oid'])
-                            collection.insert_many(data)
-                        else:
-                            doc = data
-                            if '_id' in doc and isinstance(doc['_id'], dict) and '$oid' in doc['_id']:
-                                doc['_id'] = ObjectId(doc['_id']['$oid'])
-                            collection.insert_one(doc)
+                        # skipped when the manifest of the collection matches the template, otherwise
+                        # streamed in batches or applied entry by entry
+                        result = seed_template(collection, os.path.join(TEMPLATE_DIR, template_file), mode, force)
+                        seeded[collection_name] = dict(result, file=template_file)
                     except FileNotFoundError:
                         logger.exception(f"{template_file} not found")
                         return {
@@ -104,6 +111,13 @@ def lambda_handler(event, context):
                             'headers': cors_headers,
                             'body': json.dumps({'error': f'Invalid JSON format in {template_file}'})
                         }
+                    except ValueError as e:
+                        logger.exception(f"Cannot seed {collection_name} from {template_file}")
+                        return {
+                            'statusCode': 400,
+                            'headers': cors_headers,
+                            'body': json.dumps({'error': str(e)})
+                        }
                 else:
                     collection.insert_one({"init": True})
                     collection.delete_one({"init": True})
@@ -115,7 +129,8 @@ def lambda_handler(event, context):
                 'headers': cors_headers,
                 'body': json.dumps({
                     'message': f'Successfully initialized collections for {client_name}.',
-                    'created_collections': created_collections
+                    'created_collections': created_collections,
+                    'seeded': seeded
                 })
             }
 
@@ -0,0 +1,583 @@
+import io
+import os
+import re
+import sys
+import gzip
+import mmap
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, ReplaceOne
+
+
+logger = logging.getLogger()
+
+
+# Seed files are read SEED_READ_SIZE bytes at a time
+SEED_READ_SIZE = int(os.environ.get('SEED_READ_SIZE', str(64 * 1024)))
+# Batches hold at most SEED_BATCH_SIZE documents and about SEED_BATCH_BYTES of BSON
+SEED_BATCH_SIZE = int(os.environ.get('SEED_BATCH_SIZE', '5000'))
+SEED_BATCH_BYTES = int(os.environ.get('SEED_BATCH_BYTES', str(2 * 1024 * 1024)))
+# Unordered insert_many calls running at the same time, over the connection pool of the client
+SEED_WORKERS = int(os.environ.get('SEED_WORKERS', '8'))
+# documents encoded to estimate the size of a batch
+SEED_SAMPLE_SIZE = 32
+# Pre-encoded BSON snapshots of the templates are used instead of the json files when present
+SEED_SNAPSHOTS = os.environ.get('SEED_SNAPSHOTS', 'true').lower() == 'true'
+
+# Seeded collections are stamped with a manifest in SEED_MANIFEST_COLLECTION of the client database
+SEED_MANIFEST_COLLECTION = os.environ.get('SEED_MANIFEST_COLLECTION', 'seedManifests')
+# version of the documents written by the seeder, collections stamped with another one are reloaded
+SEED_MANIFEST_VERSION = 1
+# field identifying a document of the template when only the changed entries are applied
+DOCUMENT_KEYS = {'mapping': 'name', 'documents': '_id'}
+
+# Compressed templates (brand_id.json.gz, brand_id.json.zst) are found from the plain name too,
+# the compression is detected from the first bytes of the file
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+MAGIC_BYTES = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+# mapping: {"name": id, ...}, one {name, id} document per entry
+# documents: [{...}, ...], one document per element
+# document: {...}, the whole object as a single document
+SEED_MODES = ('auto', 'mapping', 'documents', 'document')
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class JsonStream:
+    # incremental reader of a json file, only the value being parsed and the unread part of the
+    # last chunk are kept in memory
+    def __init__(self, f, read_size=SEED_READ_SIZE):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non whitespace character, None at the end of the file
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.buffer, self.pos)
+        self.pos += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk ("2." of "2.5e3")
+            is_number = isinstance(value, (int, float))
+            if is_number and not self.eof and not self.buffer[end:].strip('0123456789+-.eE') and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def end(self):
+        if self.peek() is not None:
+            raise json.JSONDecodeError("Extra data", self.buffer, self.pos)
+
+
+def iter_object_items(stream):
+    # (key, value) pairs of the object at the current position
+    stream.expect('{')
+    if stream.peek() == '}':
+        stream.pos += 1
+        return
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise json.JSONDecodeError("Expecting property name", stream.buffer, stream.pos)
+        stream.expect(':')
+        yield key, stream.value()
+        if stream.expect(',}') == '}':
+            return
+
+
+def iter_array_items(stream):
+    stream.expect('[')
+    if stream.peek() == ']':
+        stream.pos += 1
+        return
+    while True:
+        yield stream.value()
+        if stream.expect(',]') == ']':
+            return
+
+
+def convert_object_id(doc):
+    # extended json {"$oid": ...} ids of the exported templates
+    if isinstance(doc, dict) and isinstance(doc.get('_id'), dict) and '$oid' in doc['_id']:
+        doc['_id'] = ObjectId(doc['_id']['$oid'])
+    return doc
+
+
+def resolve_template(template_file):
+    # the file holding a template: the file itself, or its compressed version
+    if not os.path.isfile(template_file):
+        for suffix in COMPRESSION_SUFFIXES:
+            if os.path.isfile(template_file + suffix):
+                return template_file + suffix
+    return template_file
+
+
+def detect_compression(path):
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+@contextmanager
+def open_template_bytes(template_file):
+    # byte stream of a template, decompressed while it is read so only one chunk is in memory
+    path = resolve_template(template_file)
+    match detect_compression(path):
+        case 'gzip':
+            f = gzip.open(path, 'rb')
+        case 'zstd':
+            # zstandard is only needed in the bundle when zstd templates are shipped
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError(f"{path} is zstd compressed, the zstandard package is not installed")
+            f = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        case _:
+            f = open(path, 'rb')
+    with f:
+        yield f
+
+
+@contextmanager
+def open_template(template_file):
+    # text stream of a template
+    with open_template_bytes(template_file) as f:
+        yield io.TextIOWrapper(f, encoding='utf-8')
+
+
+def template_spec(spec):
+    # "file.json" or {"file": "file.json", "mode": "mapping", "force": true}, returns (file, mode, force)
+    if isinstance(spec, str):
+        return spec, 'auto', False
+    if isinstance(spec, dict) and isinstance(spec.get('file'), str):
+        mode = spec.get('mode', 'auto')
+        if mode not in SEED_MODES:
+            raise ValueError(f"Invalid template mode: {mode}, expected one of {', '.join(SEED_MODES)}")
+        return spec['file'], mode, bool(spec.get('force', False))
+    raise ValueError(f"Invalid template file specification: {spec}")
+
+
+def _mapping_documents(first_item, items):
+    if first_item is not None:
+        yield {'name': first_item[0], 'id': first_item[1]}
+    for name, value in items:
+        yield {'name': name, 'id': value}
+
+
+def _single_document(first_item, items):
+    doc = dict([first_item]) if first_item is not None else {}
+    doc.update(items)
+    yield convert_object_id(doc)
+
+
+def iter_seed_documents(stream, mode):
+    # returns the resolved mode and a generator of the documents to insert. in auto mode an array
+    # is read as documents, an object as a mapping when its first value is a number (ids) and as
+    # a single document otherwise
+    start = stream.peek()
+    if start == '[':
+        if mode not in ('auto', 'documents'):
+            raise ValueError(f"Template is an array, it cannot be loaded in {mode} mode")
+        return 'documents', (convert_object_id(doc) for doc in iter_array_items(stream))
+    if start != '{':
+        raise json.JSONDecodeError("Expecting an object or an array", stream.buffer, stream.pos)
+    if mode == 'documents':
+        raise ValueError("Template is an object, it cannot be loaded in documents mode")
+
+    items = iter_object_items(stream)
+    first_item = next(items, None)
+    if mode == 'auto':
+        is_id = first_item is not None and isinstance(first_item[1], (int, float)) and not isinstance(first_item[1], bool)
+        mode = 'mapping' if is_id else 'document'
+    if mode == 'mapping':
+        return mode, _mapping_documents(first_item, items)
+    return mode, _single_document(first_item, items)
+
+
+def batched(documents, size):
+    batch = []
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def tuned_batch_size(sample, max_size=SEED_BATCH_SIZE, max_bytes=SEED_BATCH_BYTES):
+    # documents per batch for about max_bytes of BSON, from the average size of the first documents
+    if not sample:
+        return max_size
+    average = sum(len(bson.encode(doc)) for doc in sample) / len(sample)
+    return max(1, min(max_size, int(max_bytes // average)))
+
+
+def _insert_batch(collection, batch):
+    # unordered: the server does not stop at the first failed document and may apply the batch in any order.
+    # a failed document raises BulkWriteError, so the batch was inserted whole when it returns. counted from
+    # the batch: inserted_ids leaves out the RawBSONDocuments of the snapshots
+    collection.insert_many(batch, ordered=False)
+    return len(batch)
+
+
+def insert_batches(collection, batches, workers=SEED_WORKERS):
+    # batches are inserted by the pool while the next ones are parsed, at most 2 * workers of them
+    # are held in memory. returns (inserted documents, batches)
+    inserted = 0
+    count = 0
+    pending = set()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for batch in batches:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                inserted += sum(future.result() for future in done)
+            pending.add(executor.submit(_insert_batch, collection, batch))
+            count += 1
+        inserted += sum(future.result() for future in wait(pending).done)
+    finally:
+        # a failed batch cancels the queued ones, the running ones are awaited
+        executor.shutdown(wait=True, cancel_futures=True)
+    return inserted, count
+
+
+def snapshot_paths(template_file):
+    # brand_id.json(.gz) -> brand_id.bson (concatenated BSON documents) and brand_id.bson.idx (batches)
+    base, extension = os.path.splitext(template_file)
+    if extension in COMPRESSION_SUFFIXES:
+        base = os.path.splitext(base)[0]
+    return base + '.bson', base + '.bson.idx'
+
+
+def template_sha256(template_file):
+    # hash of the decompressed template: the same whether it is shipped as json, gzip or zstd, and
+    # whatever the compressor wrote in its headers (e.g. the mtime of gzip)
+    digest = hashlib.sha256()
+    with open_template_bytes(template_file) as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_snapshot(template_file, mode='auto', max_size=SEED_BATCH_SIZE, max_bytes=SEED_BATCH_BYTES):
+    # build time: the template is parsed, its ids converted and its documents encoded once, and cut
+    # into batches of at most max_size documents and max_bytes of BSON recorded in the index
+    snapshot_path, index_path = snapshot_paths(template_file)
+    batches = []
+    offset = batch_start = batch_documents = 0
+    with open_template(template_file) as f, open(snapshot_path, 'wb') as out:
+        stream = JsonStream(f)
+        mode, documents = iter_seed_documents(stream, mode)
+        for doc in documents:
+            data = bson.encode(doc)
+            if batch_documents and (batch_documents >= max_size or offset + len(data) - batch_start > max_bytes):
+                batches.append([batch_start, offset - batch_start, batch_documents])
+                batch_start = offset
+                batch_documents = 0
+            out.write(data)
+            offset += len(data)
+            batch_documents += 1
+        if batch_documents:
+            batches.append([batch_start, offset - batch_start, batch_documents])
+        stream.end()
+
+    index = {
+        'source': os.path.basename(resolve_template(template_file)),
+        'source_sha256': template_sha256(template_file),
+        'mode': mode,
+        'documents': sum(batch[2] for batch in batches),
+        'bytes': offset,
+        'batches': batches
+    }
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def load_snapshot_index(template_file, mode):
+    # the index of a snapshot made from the current template file in the requested mode, None otherwise
+    snapshot_path, index_path = snapshot_paths(template_file)
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not os.path.isfile(snapshot_path):
+        return None
+    if mode not in ('auto', index['mode']):
+        logger.info(f"Snapshot of {template_file} is in {index['mode']} mode, reading the json file in {mode} mode")
+        return None
+    # the json file can be left out of the bundle, it is only compared when present
+    source = resolve_template(template_file)
+    if os.path.isfile(source) and template_sha256(source) != index['source_sha256']:
+        logger.warning(f"Snapshot of {template_file} is out of date, reading the json file")
+        return None
+    return index
+
+
+def iter_snapshot_batches(mapped, index):
+    # RawBSONDocument batches over the mapped snapshot, the bytes are sent as they are
+    for offset, length, count in index['batches']:
+        batch = []
+        position = offset
+        end = offset + length
+        while position < end:
+            size = int.from_bytes(mapped[position:position + 4], 'little')
+            batch.append(RawBSONDocument(mapped[position:position + size]))
+            position += size
+        if position != end or len(batch) != count:
+            raise ValueError(f"Corrupted snapshot batch at offset {offset}")
+        yield batch
+
+
+def seed_collection(collection, template_file, mode='auto', batch_size=None, workers=SEED_WORKERS):
+    # inserts the BSON snapshot of the template when there is an up to date one, otherwise streams
+    # the json file, batch_size being tuned from the documents when not given
+    index = load_snapshot_index(template_file, mode) if SEED_SNAPSHOTS else None
+    return _load_collection(collection, template_file, mode, index, batch_size, workers)
+
+
+def _load_collection(collection, template_file, mode, index, batch_size=None, workers=SEED_WORKERS):
+    start = time.perf_counter()
+    if index is not None:
+        source = 'snapshot'
+        mode = index['mode']
+        batch_size = max((batch[2] for batch in index['batches']), default=0)
+        with open(snapshot_paths(template_file)[0], 'rb') as f:
+            if index['bytes']:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    inserted, batches = insert_batches(collection, iter_snapshot_batches(mapped, index), workers)
+            else:
+                inserted, batches = 0, 0
+    else:
+        source = 'json'
+        with open_template(template_file) as f:
+            stream = JsonStream(f)
+            mode, documents = iter_seed_documents(stream, mode)
+            if batch_size is None:
+                sample = list(islice(documents, SEED_SAMPLE_SIZE))
+                batch_size = tuned_batch_size(sample)
+                documents = chain(sample, documents)
+            inserted, batches = insert_batches(collection, batched(documents, batch_size), workers)
+            stream.end()
+
+    if mode == 'mapping':
+        # mapping documents are looked up by name
+        collection.create_index('name')
+
+    seconds = time.perf_counter() - start
+    docs_per_second = round(inserted / seconds) if seconds else inserted
+    logger.info(
+        f"Seeded {collection.name} from {template_file} ({mode}, {source}): {inserted} documents in {batches} batches "
+        f"of {batch_size}, {workers} workers, {seconds:.2f}s, {docs_per_second} docs/s"
+    )
+    return {
+        'file': template_file,
+        'source': source,
+        'mode': mode,
+        'documents': inserted,
+        'batches': batches,
+        'batch_size': batch_size,
+        'seconds': round(seconds, 3),
+        'docs_per_second': docs_per_second
+    }
+
+
+@contextmanager
+def template_documents(template_file, mode, index):
+    # (mode, documents) of a template, decoded from its snapshot when there is one
+    if index is None:
+        with open_template(template_file) as f:
+            stream = JsonStream(f)
+            mode, documents = iter_seed_documents(stream, mode)
+            yield mode, documents
+            stream.end()
+    elif not index['bytes']:
+        yield index['mode'], iter(())
+    else:
+        with open(snapshot_paths(template_file)[0], 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield index['mode'], (
+                    bson.decode(doc.raw) for batch in iter_snapshot_batches(mapped, index) for doc in batch
+                )
+
+
+class ReloadRequired(Exception):
+    # the template cannot be compared entry by entry with the collection
+    pass
+
+
+def apply_changes(collection, documents, key, batch_size=SEED_BATCH_SIZE):
+    # writes only the entries of the template that differ from the collection and removes the others.
+    # the keys of the collection and of the template are held in memory, the documents themselves are
+    # compared one batch at a time
+    existing = {}
+    stale_ids = []
+    for doc in collection.find({}, {key: 1}):
+        value = doc.get(key)
+        # documents without the key (the single document of an older seed) or duplicated by a re-run
+        if value is None or value in existing:
+            stale_ids.append(doc['_id'])
+        else:
+            existing[value] = doc['_id']
+
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    seen = set()
+    for batch in batched(documents, batch_size):
+        if any(doc.get(key) is None for doc in batch):
+            raise ReloadRequired(f"template documents without {key}")
+        present = [doc[key] for doc in batch if doc[key] in existing]
+        current = {doc[key]: doc for doc in collection.find({key: {'$in': present}})} if present else {}
+
+        operations = []
+        for doc in batch:
+            value = doc[key]
+            if value in seen:
+                continue
+            seen.add(value)
+            old = current.get(value)
+            if old is None:
+                operations.append(InsertOne(doc))
+                counts['inserted'] += 1
+                continue
+            # the _id of documents seeded without one was given by the database
+            compared = old if '_id' in doc else {field: old[field] for field in old if field != '_id'}
+            if compared == doc:
+                counts['unchanged'] += 1
+            else:
+                operations.append(ReplaceOne({'_id': old['_id']}, doc))
+                counts['updated'] += 1
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+    removed = stale_ids + [existing[value] for value in existing.keys() - seen]
+    for ids in batched(removed, batch_size):
+        counts['deleted'] += collection.delete_many({'_id': {'$in': ids}}).deleted_count
+    return counts
+
+
+def _diff_collection(collection, template_file, mode, index, manifest):
+    start = time.perf_counter()
+    with template_documents(template_file, mode, index) as (mode, documents):
+        if mode not in DOCUMENT_KEYS:
+            raise ReloadRequired(f"{mode} templates have no document key")
+        if manifest is not None and manifest['mode'] != mode:
+            raise ReloadRequired(f"seeded in {manifest['mode']} mode, the template is read in {mode} mode")
+        counts = apply_changes(collection, documents, DOCUMENT_KEYS[mode])
+
+    if mode == 'mapping':
+        collection.create_index('name')
+
+    if counts['updated'] or counts['deleted']:
+        status = 'UPDATED'
+    else:
+        status = 'TOPPED_UP' if counts['inserted'] else 'UNCHANGED'
+    logger.info(f"{status} {collection.name} from {template_file} ({mode}): {counts}")
+    return dict(
+        counts,
+        file=template_file,
+        status=status,
+        mode=mode,
+        documents=counts['inserted'] + counts['updated'] + counts['unchanged'],
+        seconds=round(time.perf_counter() - start, 3)
+    )
+
+
+def seed_template(collection, template_file, mode='auto', force=False):
+    # the manifest of the collection is compared with the template before the data is touched: an
+    # unchanged template costs a single find_one, an empty collection is loaded, a partially seeded or
+    # changed one only gets the entries that differ, and one that cannot be compared is reloaded
+    start = time.perf_counter()
+    manifests = collection.database[SEED_MANIFEST_COLLECTION]
+    index = load_snapshot_index(template_file, mode) if SEED_SNAPSHOTS else None
+    sha256 = index['source_sha256'] if index is not None else template_sha256(template_file)
+
+    manifest = manifests.find_one({'_id': collection.name})
+    if (
+        not force and manifest is not None and manifest['sha256'] == sha256
+        and manifest['version'] == SEED_MANIFEST_VERSION and mode in ('auto', manifest['mode'])
+    ):
+        logger.info(f"{collection.name} already seeded from {manifest['source']}, skipping")
+        return {
+            'file': template_file,
+            'status': 'SKIPPED',
+            'mode': manifest['mode'],
+            'documents': manifest['documents'],
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+    result = None
+    if collection.find_one({}, {'_id': 1}) is None:
+        result = dict(_load_collection(collection, template_file, mode, index), status='LOADED')
+    elif manifest is None or manifest['version'] == SEED_MANIFEST_VERSION:
+        try:
+            result = _diff_collection(collection, template_file, mode, index, manifest)
+        except ReloadRequired as e:
+            logger.info(f"Reloading {collection.name}: {e}")
+    if result is None:
+        collection.delete_many({})
+        result = dict(_load_collection(collection, template_file, mode, index), status='RELOADED')
+
+    manifests.replace_one({'_id': collection.name}, {
+        'source': os.path.basename(resolve_template(template_file)),
+        'sha256': sha256,
+        'mode': result['mode'],
+        'documents': result['documents'],
+        'version': SEED_MANIFEST_VERSION,
+        'seeded_at': datetime.now(timezone.utc)
+    }, upsert=True)
+    return result
+
+
+if __name__ == '__main__':
+    # python seed.py brand_id.json category_id.json:mapping ..., writes the snapshot next to each file
+    for argument in sys.argv[1:]:
+        path, _, requested_mode = argument.partition(':')
+        snapshot = write_snapshot(path, requested_mode or 'auto')
+        print(f"{path}: {snapshot['documents']} documents ({snapshot['mode']}), "
+              f"{len(snapshot['batches'])} batches, {snapshot['bytes'] / 1024 / 1024:.1f} MB")
@@ -1,9 +1,8 @@
 import os
 import json
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 from bson import ObjectId
 import logging
+from mongo_common import mongo_connection, ConnectionFailure
 
 
 logger = logging.getLogger()
@@ -11,7 +10,6 @@ logger.setLevel(logging.INFO)
 
 
 # MongoDB Configuration
-MONGODB_URI = os.environ.get('MONGODB_URI')
 DOCUMENT_ID = os.environ.get('DOCUMENT_ID')
 
 # CORS header
@@ -40,8 +38,7 @@ def lambda_handler(event, context):
         logger.info(f"Processing request for client: {client_name}")
 
         # connect to MongoDB
-        with MongoClient(MONGODB_URI) as client:
-            client.admin.command('ping')
+        with mongo_connection() as client:
             
             client_db_mapping = client['clientInfo']
             collection = client_db_mapping['clientDbMapping']
@@ -1,21 +1,17 @@
-import os
 import json
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
 import boto3
+import botocore_model_cache
 from botocore.exceptions import ClientError
 import logging
+from mongo_common import mongo_connection, get_config_doc, config_refresh_requested, ConnectionFailure
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-# MongoDB Configuration
-MONGODB_URI = os.environ.get('MONGODB_URI')
-
-
 # AWS Configuration
+botocore_model_cache.install()
 batch_client = boto3.client('batch')
 
 
@@ -91,14 +87,19 @@ def lambda_handler(event, context):
         logger.info(f"Processing request of client: {client_name} for connector: {connector}")
 
         # connect to MongoDB
-        with MongoClient(MONGODB_URI) as client:
-            client.admin.command('ping')
+        with mongo_connection() as client:
 
             # select the appropriate database and configuration collection
             logger.info("Connecting to the database")
             db = client[client_name]
-            config_collection = db[f'{client_name}_Configuration']
-            config_doc = config_collection.find_one()
+            config_doc = get_config_doc(
+                db, client_name,
+                required_keys=[
+                    f"{connector.upper()}_JOB_QUEUE_NAME",
+                    f"{connector.upper()}_COMPUTE_ENVIRONMENT_NAME"
+                ],
+                refresh=config_refresh_requested(event)
+            )
 
             if not config_doc:
                 logger.warning(f"No configuration found for client: {client_name}")
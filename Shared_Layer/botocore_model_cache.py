@@ -0,0 +1,100 @@
+# boto3 service models precompiled by Build/build_bundle.py. the functions creating boto3 clients import it
+# from the shared layer or their bundle and call install() first, which does nothing when there is no usable cache
+
+import os
+import sys
+import pickle
+import logging
+
+import boto3
+import botocore
+import botocore.session
+from botocore.exceptions import DataNotFoundError
+from botocore.loaders import Loader
+
+
+logger = logging.getLogger()
+
+
+# Service models serialized at build time by Build/build_bundle.py, next to this module
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'botocore_models.pickle')
+
+# model types a client loads when it is created or when it builds a paginator or a waiter
+MODEL_TYPES = ['service-2', 'endpoint-rule-set-1', 'paginators-1', 'waiters-2']
+# top level data files loaded by every client
+DATA_NAMES = ['endpoints', 'partitions', '_retry', 'sdk-default-configuration']
+
+
+class CachedLoader(Loader):
+    # answers from the deserialized models and falls back to the json files for anything else
+    def __init__(self, models, data, **kwargs):
+        super().__init__(**kwargs)
+        self._cached_models = models
+        self._cached_data = data
+
+    def load_service_model(self, service_name, type_name, api_version=None):
+        model = self._cached_models.get((service_name, type_name, api_version))
+        if model is None:
+            return super().load_service_model(service_name, type_name, api_version)
+        return model
+
+    def load_data_with_path(self, name):
+        data = self._cached_data.get(name)
+        if data is None:
+            return super().load_data_with_path(name)
+        # the cache only holds the data shipped with botocore
+        return data, os.path.join(self.BUILTIN_DATA_PATH, name)
+
+
+def write_cache(services, path=CACHE_PATH):
+    # the models are read through botocore's own loader, sdk extras merged, so the cache holds
+    # exactly what load_service_model would return at runtime
+    loader = Loader()
+    models = {}
+    for service_name in services:
+        for type_name in MODEL_TYPES:
+            try:
+                model = loader.load_service_model(service_name, type_name)
+            except DataNotFoundError:
+                continue
+            api_version = loader.determine_latest_version(service_name, type_name)
+            models[(service_name, type_name, None)] = model
+            models[(service_name, type_name, api_version)] = model
+
+    data = {name: loader.load_data(name) for name in DATA_NAMES}
+    with open(path, 'wb') as f:
+        pickle.dump({'botocore_version': botocore.__version__, 'models': models, 'data': data}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    return len(models)
+
+
+def install(path=CACHE_PATH):
+    # sets up the default boto3 session with the cached loader, returns False when there is no
+    # usable cache and boto3 keeps parsing the json files
+    try:
+        with open(path, 'rb') as f:
+            cache = pickle.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable botocore model cache {path}: {e}")
+        return False
+
+    if cache['botocore_version'] != botocore.__version__:
+        logger.warning(
+            f"Ignoring botocore model cache built for botocore {cache['botocore_version']}, running {botocore.__version__}"
+        )
+        return False
+
+    session = botocore.session.get_session()
+    # models added through AWS_DATA_PATH take precedence over the ones shipped with botocore
+    if session.get_config_variable('data_path'):
+        return False
+    session.register_component('data_loader', CachedLoader(cache['models'], cache['data']))
+    boto3.setup_default_session(botocore_session=session)
+    return True
+
+
+if __name__ == '__main__':
+    # python botocore_model_cache.py <service> ..., run with the bundled botocore on the path
+    print(f"{write_cache(sys.argv[1:])} service models written to {CACHE_PATH}")
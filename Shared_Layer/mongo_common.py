@@ -0,0 +1,117 @@
+# MongoDB client and configuration cache shared by the Create_* functions. shipped in the shared layer,
+# Build/build_bundle.py copies it into the bundles built without the layer
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import bson
+import pymongo
+from pymongo import MongoClient
+# ConnectionFailure is also imported from here by the handlers
+from pymongo.errors import ConnectionFailure
+
+
+logger = logging.getLogger()
+
+
+# Without the C extensions bson falls back to pure Python encoding, several times slower.
+# warn (default) logs it, require refuses to start
+BSON_C_EXTENSIONS = os.environ.get('BSON_C_EXTENSIONS', 'warn').lower()
+if not (bson.has_c() and pymongo.has_c()):
+    if BSON_C_EXTENSIONS == 'require':
+        raise ImportError("bson/pymongo C extensions are not available, build the bundle with Build/build_bundle.py")
+    logger.warning("bson/pymongo C extensions are not available, using the pure Python BSON encoder")
+
+
+# MongoDB Configuration
+MONGODB_URI = os.environ.get('MONGODB_URI')
+# client kept by the container between invocations, one for all the handlers imported in the same process
+mongo_client = None
+mongo_client_lock = threading.Lock()
+
+
+# Configuration documents cache, keyed by client name
+CONFIG_CACHE_TTL = int(os.environ.get('CONFIG_CACHE_TTL', '60'))
+CONFIG_CACHE_SIZE = int(os.environ.get('CONFIG_CACHE_SIZE', '128'))
+config_cache = OrderedDict()
+config_cache_lock = threading.Lock()
+
+
+def get_mongo_client():
+    # created on the first invocation and reused by the warm ones, which skip the DNS lookup,
+    # TLS handshake, authentication and topology discovery of a new client
+    global mongo_client
+    with mongo_client_lock:
+        if mongo_client is None:
+            logger.info("Creating MongoDB client")
+            mongo_client = MongoClient(MONGODB_URI)
+        client = mongo_client
+    # no round trip while the client still knows a primary, ping only when it has to discover one
+    if not client.topology_description.has_writable_server():
+        client.admin.command('ping')
+    return client
+
+
+def discard_mongo_client():
+    global mongo_client
+    with mongo_client_lock:
+        client, mongo_client = mongo_client, None
+    if client is not None:
+        client.close()
+
+
+@contextmanager
+def mongo_connection():
+    # the client is dropped when the connection fails, the next invocation creates a new one
+    try:
+        yield get_mongo_client()
+    except ConnectionFailure:
+        logger.warning("MongoDB connection failed, discarding the client")
+        discard_mongo_client()
+        raise
+
+
+def config_refresh_requested(event):
+    # Cache-Control: no-cache, sent by the orchestrator once it wrote the configuration in the same run
+    request_headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    return 'no-cache' in (request_headers.get('cache-control') or '').lower()
+
+
+def get_config_doc(db, client_name, required_keys=(), refresh=False):
+    # served from the container for CONFIG_CACHE_TTL seconds without a round trip, then revalidated
+    # against the CONFIG_VERSION written by Create_Config_Mongo and only fetched again when it changed.
+    # a cached document missing one of required_keys is fetched again right away, the configuration
+    # of another connector may have been written since, and refresh skips the cache altogether
+    config_collection = db[f'{client_name}_Configuration']
+    now = time.monotonic()
+    with config_cache_lock:
+        entry = None if refresh else config_cache.get(client_name)
+        if entry is not None:
+            config_cache.move_to_end(client_name)
+            if not all(entry['document'].get(key) for key in required_keys):
+                entry = None
+            elif now < entry['expires_at']:
+                return entry['document']
+
+    if entry is not None and entry['document'].get('CONFIG_VERSION') is not None:
+        current = config_collection.find_one({}, {'CONFIG_VERSION': 1})
+        if current and current.get('CONFIG_VERSION') == entry['document']['CONFIG_VERSION']:
+            with config_cache_lock:
+                entry['expires_at'] = now + CONFIG_CACHE_TTL
+            return entry['document']
+
+    config_doc = config_collection.find_one()
+    with config_cache_lock:
+        if config_doc:
+            config_cache[client_name] = {'document': config_doc, 'expires_at': now + CONFIG_CACHE_TTL}
+            config_cache.move_to_end(client_name)
+            # least recently used clients are dropped first
+            while len(config_cache) > CONFIG_CACHE_SIZE:
+                config_cache.popitem(last=False)
+        else:
+            config_cache.pop(client_name, None)
+    return config_doc